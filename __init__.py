@@ -29,17 +29,25 @@ class WordDumbDumb(InterfaceActionBase):
     def cli_main(self, argv):
         import argparse
         import json
+        import time
         from pathlib import Path
 
         from calibre.utils.logging import Log
 
         from .metadata import cli_check_metadata
         from .parse_job import ParseJobData, do_job
-        from .utils import get_book_settings_path
+        from .utils import get_book_settings_path, run_lanes, split_lanes
 
         parser = argparse.ArgumentParser(prog="calibre-debug -r WordDumb --")
         parser.add_argument("-w", help="Create Word Wise", action="store_true")
         parser.add_argument("-x", help="Create X-Ray", action="store_true")
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            help="Number of books processed at the same time",
+            type=int,
+            default=1,
+        )
         parser.add_argument(
             "-v", "--version", action="version", version=".".join(map(str, VERSION))
         )
@@ -47,16 +55,17 @@ class WordDumbDumb(InterfaceActionBase):
         args = parser.parse_args(argv[1:])
 
         log = Log()
-        create_w = args.w
-        create_x = args.x
-        if not create_w and not create_x:
-            create_w = True
-            create_x = True
+        if not args.w and not args.x:
+            args.w = True
+            args.x = True
 
+        jobs = []
         for file_path in args.book_path:
             md_result = cli_check_metadata(file_path, log)
             if md_result is None:
                 continue
+            create_w = args.w
+            create_x = args.x
             if create_w and not md_result.support_ww_list[0]:
                 create_w = False
                 log.prints(
@@ -79,23 +88,48 @@ class WordDumbDumb(InterfaceActionBase):
                 with config_path.open() as f:
                     book_settings = json.load(f)
 
+            jobs.append(
+                ParseJobData(
+                    book_fmt=md_result.book_fmts[0],
+                    book_path=file_path,
+                    mi=md_result.mi,
+                    book_lang=md_result.book_lang,
+                    create_ww=create_w,
+                    create_x=create_x,
+                    book_settings=book_settings,
+                )
+            )
+
+        # each lane loads the spaCy models of its languages once, books of
+        # one language are split to all lanes
+        lanes = split_lanes(jobs, lambda x: x.book_lang, args.jobs)
+
+        def run_job(job_data: ParseJobData, worker_id: int) -> int | None:
             notif = []
-            if create_w:
+            if job_data.create_ww:
                 notif.append("Word Wise")
-            if create_x:
+            if job_data.create_x:
                 notif.append("X-Ray")
             notif_str = " and ".join(notif)
             log.prints(
                 Log.INFO,
-                f"Creating {notif_str} file for book {md_result.mi.get('title')}",
+                f"Creating {notif_str} file for book {job_data.mi.get('title')}",
             )
-            job_data = ParseJobData(
-                book_fmt=md_result.book_fmts[0],
-                book_path=file_path,
-                mi=md_result.mi,
-                book_lang=md_result.book_lang,
-                create_ww=create_w,
-                create_x=create_x,
-                book_settings=book_settings,
+            try:
+                job_data = do_job(job_data, worker_id=worker_id)
+            except Exception:
+                log.exception(f"Failed to create files for {job_data.book_path}")
+                return None
+            return job_data.word_count
+
+        start_time = time.perf_counter()
+        results = [result for result in run_lanes(lanes, run_job) if result is not None]
+        elapsed = time.perf_counter() - start_time
+        books = len(results)
+        words = sum(results)
+        if books > 0 and elapsed > 0:
+            log.prints(
+                Log.INFO,
+                f"Processed {books} books in {elapsed:.1f}s, "
+                f"{books * 60 / elapsed:.2f} books/min, {words / elapsed:.0f} words/s",
             )
-            do_job(job_data)
@@ -11,27 +11,39 @@ from pathlib import Path
 from dump_lemmas import dump_spacy_docs
 from parse_job import ParseJobData, create_files
 
-parser = argparse.ArgumentParser()
-parser.add_argument("job_data")
-parser.add_argument("prefs")
-args = parser.parse_args()
+# spaCy's worker processes import this module again on spawn platforms
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("job_data", nargs="?")
+    parser.add_argument("prefs", nargs="?")
+    parser.add_argument("--worker", action="store_true")
+    args = parser.parse_args()
 
-job_data = json.loads(args.job_data)
-prefs = json.loads(args.prefs)
-if "db_path" in job_data:
-    dump_spacy_docs(
-        job_data["model_name"],
-        job_data["is_kindle"],
-        job_data["lemma_lang"],
-        Path(job_data["db_path"]),
-        Path(job_data["plugin_path"]),
-        prefs,
-    )
-else:
-    data = ParseJobData(**job_data)
-    if data.book_fmt == "KFX":
-        data.kfx_json = json.load(sys.stdin)
-    elif data.book_fmt != "EPUB":
-        data.mobi_html = sys.stdin.buffer.read()
+    if args.worker:
+        from nlp_worker import serve
 
-    create_files(data, prefs, None)
+        serve()
+    else:
+        job_data = json.loads(args.job_data)
+        prefs = json.loads(args.prefs)
+        if "db_path" in job_data:
+            from nlp_worker import WorkerNotifications, private_stdout
+
+            output = private_stdout()
+            dump_spacy_docs(
+                job_data["model_name"],
+                job_data["is_kindle"],
+                job_data["lemma_lang"],
+                Path(job_data["db_path"]),
+                Path(job_data["plugin_path"]),
+                prefs,
+                WorkerNotifications(output),
+            )
+        else:
+            data = ParseJobData(**job_data)
+            if data.book_fmt == "KFX":
+                data.kfx_json = json.load(sys.stdin)
+            elif data.book_fmt != "EPUB":
+                data.mobi_html = sys.stdin.buffer.read()
+
+            create_files(data, prefs, None)
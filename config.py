@@ -1,4 +1,5 @@
 import json
+import os
 import webbrowser
 from functools import partial
 from pathlib import Path
@@ -32,6 +33,7 @@ from .deps import download_word_wise_file, install_deps, which_python
 from .dump_lemmas import dump_spacy_docs
 from .error_dialogs import GITHUB_URL, change_kindle_ww_lang_dialog, job_failed
 from .import_lemmas import apply_imported_lemmas_data, export_lemmas_job
+from .mediawiki import MAX_MEDIAWIKI_REQUESTS
 from .utils import (
     custom_lemmas_folder,
     donate,
@@ -39,7 +41,7 @@ from .utils import (
     get_plugin_path,
     kindle_db_path,
     load_languages_data,
-    run_subprocess,
+    run_subprocess_with_progress,
     spacy_model_name,
     wiktionary_db_path,
 )
@@ -56,6 +58,17 @@ prefs.defaults["python_path"] = ""
 prefs.defaults["show_change_kindle_ww_lang_warning"] = True
 prefs.defaults["custom_entity_only"] = False
 prefs.defaults["preview_x_ray"] = False
+prefs.defaults["nlp_processes"] = 1
+prefs.defaults["save_job_stats"] = False
+prefs.defaults["lemma_matcher"] = "phrase_matcher"
+prefs.defaults["low_memory_spacy"] = False
+prefs.defaults["two_pass_nlp"] = False
+# off by default, joined paragraphs could be tagged differently
+prefs.defaults["coalesce_paragraphs"] = False
+prefs.defaults["filter_content"] = False
+prefs.defaults["deferred_entity_clustering"] = False
+prefs.defaults["mediawiki_requests"] = 1
+prefs.defaults["prefetch_mediawiki"] = False
 for code in load_languages_data(get_plugin_path(), False).keys():
     prefs.defaults[f"{code}_wiktionary_difficulty_limit"] = 5
 
@@ -116,6 +129,32 @@ class ConfigWidget(QWidget):
         )
         form_layout.addRow(minimal_x_ray_label, self.minimal_x_ray_count)
 
+        self.nlp_processes = QSpinBox()
+        self.nlp_processes.setMinimum(1)
+        self.nlp_processes.setMaximum(os.cpu_count() or 1)
+        self.nlp_processes.setValue(prefs["nlp_processes"])
+        nlp_processes_label = QLabel(_("spaCy processes"))
+        nlp_processes_label.setToolTip(
+            _(
+                "Number of processes used to parse book text, "
+                "more processes use more memory"
+            )
+        )
+        form_layout.addRow(nlp_processes_label, self.nlp_processes)
+
+        self.mediawiki_requests = QSpinBox()
+        self.mediawiki_requests.setMinimum(1)
+        self.mediawiki_requests.setMaximum(MAX_MEDIAWIKI_REQUESTS)
+        self.mediawiki_requests.setValue(prefs["mediawiki_requests"])
+        mediawiki_requests_label = QLabel(_("Concurrent MediaWiki requests"))
+        mediawiki_requests_label.setToolTip(
+            _(
+                "Number of X-Ray description requests sent at the same time, "
+                "servers may limit requests from one user"
+            )
+        )
+        form_layout.addRow(mediawiki_requests_label, self.mediawiki_requests)
+
         self.zh_wiki_box = QComboBox()
         zh_variants = {
             "cn": "大陆简体",
@@ -129,6 +168,18 @@ class ConfigWidget(QWidget):
             self.zh_wiki_box.addItem(text, variant)
         self.zh_wiki_box.setCurrentText(zh_variants[prefs["zh_wiki_variant"]])
         form_layout.addRow(_("Chinese Wikipedia variant"), self.zh_wiki_box)
+
+        self.lemma_matcher_box = QComboBox()
+        self.lemma_matcher_box.addItem("spaCy PhraseMatcher", "phrase_matcher")
+        self.lemma_matcher_box.addItem("Aho-Corasick", "aho_corasick")
+        self.lemma_matcher_box.setCurrentIndex(
+            self.lemma_matcher_box.findData(prefs["lemma_matcher"])
+        )
+        lemma_matcher_label = QLabel(_("Word Wise matcher"))
+        lemma_matcher_label.setToolTip(
+            _("Algorithm used to find Word Wise words, both create the same result")
+        )
+        form_layout.addRow(lemma_matcher_label, self.lemma_matcher_box)
         vl.addLayout(form_layout)
 
         self.custom_entity_only = QCheckBox(_("Only use customized X-Ray entities"))
@@ -139,6 +190,78 @@ class ConfigWidget(QWidget):
         self.preview_x_ray.setChecked(prefs["preview_x_ray"])
         vl.addWidget(self.preview_x_ray)
 
+        self.low_memory_spacy = QCheckBox(_("Reduce spaCy memory usage"))
+        self.low_memory_spacy.setToolTip(
+            _(
+                "Don't load word vectors that aren't used by the spaCy model, "
+                "read the used word vectors from disk when needed"
+            )
+        )
+        self.low_memory_spacy.setChecked(prefs["low_memory_spacy"])
+        vl.addWidget(self.low_memory_spacy)
+
+        self.two_pass_nlp = QCheckBox(_("Skip paragraphs without Word Wise words"))
+        self.two_pass_nlp.setToolTip(
+            _(
+                "Faster Word Wise jobs, only run the spaCy pipeline on paragraphs "
+                "that could have Word Wise words. X-Ray jobs don't skip paragraphs."
+            )
+        )
+        self.two_pass_nlp.setChecked(prefs["two_pass_nlp"])
+        vl.addWidget(self.two_pass_nlp)
+
+        self.coalesce_paragraphs = QCheckBox(_("Join short paragraphs"))
+        self.coalesce_paragraphs.setToolTip(
+            _(
+                "Parse adjacent short paragraphs together. Faster, but spaCy "
+                "sees the neighbouring paragraphs, so tags, lemmas and entities "
+                "could be different from parsing each paragraph alone and the "
+                "Word Wise and X-Ray files could change."
+            )
+        )
+        self.coalesce_paragraphs.setChecked(prefs["coalesce_paragraphs"])
+        vl.addWidget(self.coalesce_paragraphs)
+
+        self.filter_content = QCheckBox(_("Skip non-prose text"))
+        self.filter_content.setToolTip(
+            _(
+                "Don't parse table of contents, scripts, styles and text "
+                "without letters like page numbers"
+            )
+        )
+        self.filter_content.setChecked(prefs["filter_content"])
+        vl.addWidget(self.filter_content)
+
+        self.deferred_entity_clustering = QCheckBox(
+            _("Group similar X-Ray names after parsing")
+        )
+        self.deferred_entity_clustering.setToolTip(
+            _(
+                "Compare all X-Ray names once after parsing the book, faster for "
+                "books have many names and the result doesn't depend on the order "
+                "of the names in the book"
+            )
+        )
+        self.deferred_entity_clustering.setChecked(prefs["deferred_entity_clustering"])
+        vl.addWidget(self.deferred_entity_clustering)
+
+        self.prefetch_mediawiki = QCheckBox(_("Download X-Ray descriptions earlier"))
+        self.prefetch_mediawiki.setToolTip(
+            _(
+                "Download descriptions of frequent X-Ray entities while parsing "
+                "the book, some downloaded descriptions may not be used"
+            )
+        )
+        self.prefetch_mediawiki.setChecked(prefs["prefetch_mediawiki"])
+        vl.addWidget(self.prefetch_mediawiki)
+
+        self.save_job_stats = QCheckBox(_("Save job statistics"))
+        self.save_job_stats.setToolTip(
+            _("Save the time used by each step to a JSON file in the book folder")
+        )
+        self.save_job_stats.setChecked(prefs["save_job_stats"])
+        vl.addWidget(self.save_job_stats)
+
         delete_file_button = QPushButton(_("Delete downloaded files"))
         delete_file_button.clicked.connect(self.open_delete_files_dialog)
         vl.addWidget(delete_file_button)
@@ -165,8 +288,20 @@ class ConfigWidget(QWidget):
         prefs["python_path"] = self.python_path.text()
         prefs["zh_wiki_variant"] = self.zh_wiki_box.currentData()
         prefs["minimal_x_ray_count"] = self.minimal_x_ray_count.value()
+        prefs["nlp_processes"] = self.nlp_processes.value()
+        prefs["mediawiki_requests"] = self.mediawiki_requests.value()
         prefs["custom_entity_only"] = self.custom_entity_only.isChecked()
         prefs["preview_x_ray"] = self.preview_x_ray.isChecked()
+        prefs["save_job_stats"] = self.save_job_stats.isChecked()
+        prefs["lemma_matcher"] = self.lemma_matcher_box.currentData()
+        prefs["low_memory_spacy"] = self.low_memory_spacy.isChecked()
+        prefs["two_pass_nlp"] = self.two_pass_nlp.isChecked()
+        prefs["coalesce_paragraphs"] = self.coalesce_paragraphs.isChecked()
+        prefs["filter_content"] = self.filter_content.isChecked()
+        prefs["deferred_entity_clustering"] = (
+            self.deferred_entity_clustering.isChecked()
+        )
+        prefs["prefetch_mediawiki"] = self.prefetch_mediawiki.isChecked()
 
     def open_format_order_dialog(self):
         format_order_dialog = FormatOrderDialog(self)
@@ -279,7 +414,7 @@ def import_lemmas_job(
     notifications: Any = None,
 ) -> None:
     apply_imported_lemmas_data(db_path, import_path, retain_lemmas, lemma_lang)
-    dump_lemmas_job(is_kindle, db_path, lemma_lang)
+    dump_lemmas_job(is_kindle, db_path, lemma_lang, notifications=notifications)
 
 
 def dump_lemmas_job(
@@ -307,9 +442,17 @@ def dump_lemmas_job(
             json.dumps(options),
             dump_prefs(prefs),
         ]
-        run_subprocess(args)
+        run_subprocess_with_progress(args, notifications)
     else:
-        dump_spacy_docs(model_name, is_kindle, lemma_lang, db_path, plugin_path, prefs)
+        dump_spacy_docs(
+            model_name,
+            is_kindle,
+            lemma_lang,
+            db_path,
+            plugin_path,
+            prefs,
+            notifications,
+        )
 
 
 class FormatOrderDialog(QDialog):
@@ -0,0 +1,117 @@
+"""
+Skip book text nodes can't have Word Wise words or X-Ray entities before
+sending them to spaCy.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Callable
+
+try:
+    from .job_stats import JobStats
+except ImportError:
+    from job_stats import JobStats
+
+
+@dataclass
+class TextNode:
+    text: str
+    # name of the HTML tag before the text, empty for KFX
+    tag: str = ""
+    in_toc: bool = False
+
+
+def is_blank(node: TextNode) -> bool:
+    return node.text.strip() == ""
+
+
+def is_code(node: TextNode) -> bool:
+    return node.tag in ("script", "style")
+
+
+def has_no_letters(node: TextNode) -> bool:
+    # page numbers, section separators
+    return not any(char.isalpha() for char in node.text)
+
+
+def is_toc(node: TextNode) -> bool:
+    return node.in_toc
+
+
+# filters run in order, the removed text is counted by the first filter
+CONTENT_FILTERS: list[tuple[str, Callable[[TextNode], bool]]] = [
+    ("blank", is_blank),
+    ("code", is_code),
+    ("no_letters", has_no_letters),
+    ("toc", is_toc),
+]
+
+
+class ContentFilter:
+    def __init__(
+        self, filters: list[tuple[str, Callable[[TextNode], bool]]] = CONTENT_FILTERS
+    ) -> None:
+        self.filters = filters
+        # filter name: [nodes, characters]
+        self.removed: dict[str, list[int]] = {}
+
+    def skip(self, node: TextNode) -> bool:
+        for name, func in self.filters:
+            if func(node):
+                removed = self.removed.setdefault(name, [0, 0])
+                removed[0] += 1
+                removed[1] += len(node.text)
+                return True
+        return False
+
+    def save_stats(self, job_stats: JobStats) -> None:
+        for name, (nodes, chars) in self.removed.items():
+            job_stats.count(f"filtered_{name}_nodes", nodes)
+            job_stats.count(f"filtered_{name}_chars", chars)
+
+
+def tag_before(html: str, pos: int) -> str:
+    tag_start = html.rfind("<", max(pos - 1000, 0), pos)
+    if tag_start == -1:
+        return ""
+    if m := re.match(r"<([\w:-]+)", html[tag_start : tag_start + 64]):
+        return m.group(1).lower()
+    return ""  # closing tag, comment
+
+
+def mobi_tag_before(html: bytes, pos: int) -> str:
+    window = html[max(pos - 1000, 0) : pos].decode("latin-1")
+    return tag_before(window, len(window))
+
+
+# the table of contents of a long book could be a few hundred links
+MAX_TOC_BYTES = 50_000
+
+
+def mobi_toc_range(mobi_html: bytes) -> tuple[int, int] | None:
+    """
+    Find the table of contents from the guide reference, it ends at the next
+    page break or the first link target after it. Return None if neither is
+    found in `MAX_TOC_BYTES`.
+    """
+    for m in re.finditer(rb"<reference\b[^>]*>", mobi_html[:10000]):
+        reference = m.group(0)
+        if re.search(rb"""type=["']?toc\b""", reference, re.I) and (
+            filepos := re.search(rb"filepos=[\"']?(\d+)", reference)
+        ):
+            toc_start = int(filepos.group(1))
+            toc_end = toc_start + MAX_TOC_BYTES
+            pagebreak = mobi_html.find(b"<mbp:pagebreak", toc_start + 1, toc_end)
+            end_markers = [] if pagebreak == -1 else [pagebreak]
+            end_markers.extend(
+                target
+                for target in map(
+                    int,
+                    re.findall(rb"filepos=[\"']?(\d+)", mobi_html[toc_start:toc_end]),
+                )
+                if toc_start < target < toc_end
+            )
+            if len(end_markers) == 0:
+                return None
+            return toc_start, min(end_markers)
+    return None
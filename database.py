@@ -1,4 +1,5 @@
 import sqlite3
+from array import array
 from pathlib import Path
 from typing import Iterator
 
@@ -14,11 +15,18 @@ def get_ll_path(asin: str, book_path: str) -> Path:
 
 def create_lang_layer(
     asin: str, book_path: str, acr: str, revision: str
-) -> tuple[sqlite3.Connection, Path]:
+) -> "GlossWriter":
     db_path = get_ll_path(asin, book_path)
-    ll_conn = sqlite3.connect(":memory:")
+    # write to a temporary file, the book won't have an incomplete file
+    # if the job fails
+    tmp_path = db_path.with_name(db_path.name + ".tmp")
+    tmp_path.unlink(missing_ok=True)
+    ll_conn = sqlite3.connect(tmp_path)
     ll_conn.executescript(
         """
+        PRAGMA journal_mode = OFF;
+        PRAGMA synchronous = OFF;
+
         CREATE TABLE metadata (
             key TEXT,
             value TEXT
@@ -46,17 +54,66 @@ def create_lang_layer(
         ("sidecarFormat", "1.0"),
     ]
     ll_conn.executemany("INSERT INTO metadata VALUES (?, ?)", metadata)
-    return ll_conn, db_path
+    return GlossWriter(ll_conn, tmp_path, db_path)
 
 
-def insert_lemma(ll_conn: sqlite3.Connection, data: tuple[int, int, int, int]) -> None:
-    ll_conn.execute(
-        """
-        INSERT INTO glosses (start, end, difficulty, sense_id, low_confidence)
-        VALUES (?, ?, ?, ?, 0)
-        """,
-        data,
-    )
+class GlossWriter:
+    """
+    Buffer LanguageLayer glosses in an array and insert them in batches.
+    """
+
+    FIELDS = 4  # start, end, difficulty, sense_id
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        tmp_path: Path,
+        db_path: Path,
+        batch_size: int = 50000,
+    ) -> None:
+        self.conn = conn
+        self.tmp_path = tmp_path
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.rows = array("q")
+        self.count = 0
+
+    def add(self, start: int, end: int | None, difficulty: int, sense_id: int) -> None:
+        self.count += 1
+        # -1 is NULL `end`
+        self.rows.extend((start, -1 if end is None else end, difficulty, sense_id))
+        if len(self.rows) >= self.batch_size * self.FIELDS:
+            self.flush()
+
+    def flush(self) -> None:
+        rows = self.rows
+        self.conn.executemany(
+            """
+            INSERT INTO glosses (start, end, difficulty, sense_id, low_confidence)
+            VALUES (?, ?, ?, ?, 0)
+            """,
+            (
+                (
+                    rows[index],
+                    None if rows[index + 1] == -1 else rows[index + 1],
+                    rows[index + 2],
+                    rows[index + 3],
+                )
+                for index in range(0, len(rows), self.FIELDS)
+            ),
+        )
+        self.conn.commit()
+        self.rows = array("q")
+
+    def close(self) -> None:
+        self.flush()
+        self.conn.execute("PRAGMA optimize")
+        self.conn.close()
+        self.tmp_path.replace(self.db_path)
+
+    def abort(self) -> None:
+        self.conn.close()
+        self.tmp_path.unlink(missing_ok=True)
 
 
 def get_x_ray_path(asin: str, book_path: str) -> Path:
@@ -1,23 +1,31 @@
 import sqlite3
+import tempfile
 from pathlib import Path
+from typing import Any
 
 try:
+    from .lemma_index import save_lemma_index
     from .utils import (
         Prefs,
         custom_lemmas_folder,
         get_spacy_model_version,
         insert_installed_libs,
+        kindle_db_path,
         load_plugin_json,
         use_kindle_ww_db,
+        wiktionary_db_path,
     )
 except ImportError:
+    from lemma_index import save_lemma_index
     from utils import (
         Prefs,
         custom_lemmas_folder,
         get_spacy_model_version,
         insert_installed_libs,
+        kindle_db_path,
         load_plugin_json,
         use_kindle_ww_db,
+        wiktionary_db_path,
     )
 
 
@@ -42,6 +50,46 @@ def spacy_doc_path(
     return path
 
 
+def lemmas_difficulty_limit(lemma_lang: str, is_kindle: bool, prefs: Prefs) -> int:
+    return 5 if is_kindle else prefs[f"{lemma_lang}_wiktionary_difficulty_limit"]
+
+
+def lemma_keywords_path(doc_path: Path, difficulty_limit: int) -> Path:
+    return doc_path.with_name(f"{doc_path.name}_difficulty_{difficulty_limit}.npz")
+
+
+def save_lemma_keywords(keywords: list[list[int]], path: Path) -> None:
+    """
+    Save the LOWER attribute hashes of the lemma docs, PhraseMatcher accepts
+    them instead of docs.
+    """
+    import numpy as np
+
+    offsets = np.zeros(len(keywords) + 1, dtype=np.int64)
+    np.cumsum([len(keyword) for keyword in keywords], out=offsets[1:])
+    hashes = np.fromiter(
+        (lower for keyword in keywords for lower in keyword),
+        dtype=np.uint64,
+        count=int(offsets[-1]),
+    )
+    # jobs run in threads of the same process, each one needs a unique file
+    with tempfile.NamedTemporaryFile(
+        dir=path.parent, prefix=f"{path.name}.", suffix=".tmp", delete=False
+    ) as f:
+        np.savez(f, hashes=hashes, offsets=offsets)
+        tmp_path = Path(f.name)
+    tmp_path.replace(path)
+
+
+def load_lemma_keywords(path: Path) -> list[list[int]]:
+    import numpy as np
+
+    with np.load(path) as data:
+        hashes = data["hashes"].tolist()
+        offsets = data["offsets"].tolist()
+    return [hashes[start:end] for start, end in zip(offsets, offsets[1:])]
+
+
 def dump_spacy_docs(
     spacy_model: str,
     is_kindle: bool,
@@ -49,11 +97,10 @@ def dump_spacy_docs(
     db_path: Path,
     plugin_path: Path,
     prefs: Prefs,
+    notifications: Any = None,
 ):
     insert_installed_libs(plugin_path)
-    import spacy
-
-    nlp = spacy.load(spacy_model) if spacy_model != "" else spacy.blank(lemma_lang)
+    nlp = load_lemma_tokenizer(spacy_model, lemma_lang)
     lemmas_conn = sqlite3.connect(db_path)
     pkg_versions = load_plugin_json(plugin_path, "data/deps.json")
     save_spacy_docs(
@@ -65,10 +112,30 @@ def dump_spacy_docs(
         lemmas_conn,
         plugin_path,
         prefs,
+        notifications,
     )
     lemmas_conn.close()
 
 
+def load_lemma_tokenizer(spacy_model: str, lemma_lang: str) -> Any:
+    """
+    Load the pipeline without components and vectors, the lemma docs only
+    need the tokenizer.
+    """
+    import spacy
+
+    if spacy_model == "":
+        return spacy.blank(lemma_lang)
+
+    from spacy.util import get_model_meta, get_package_path
+
+    meta = get_model_meta(get_package_path(spacy_model))
+    # "vectors" is passed to Vocab.from_disk()
+    return spacy.load(
+        spacy_model, exclude=["vectors", *meta.get("components", meta["pipeline"])]
+    )
+
+
 def save_spacy_docs(
     nlp,
     spacy_model: str,
@@ -78,13 +145,13 @@ def save_spacy_docs(
     lemmas_conn: sqlite3.Connection,
     plugin_path: Path,
     prefs: Prefs,
+    notifications: Any = None,
 ):
     from spacy.tokens import DocBin
 
     lemmas_doc_bin = DocBin(attrs=["LOWER"])
-    difficulty_limit = (
-        5 if is_kindle else prefs[f"{lemma_lang}_wiktionary_difficulty_limit"]
-    )
+    keywords = []
+    difficulty_limit = lemmas_difficulty_limit(lemma_lang, is_kindle, prefs)
     query_sql = """
     SELECT DISTINCT lemma
     FROM senses WHERE enabled = 1 AND difficulty <= :difficulty
@@ -93,15 +160,33 @@ def save_spacy_docs(
     FROM senses s JOIN forms f ON s.form_group_id = f.form_group_id
     AND enabled = 1 AND difficulty <= :difficulty
     """
-    for doc in nlp.tokenizer.pipe(
-        map(
-            lambda x: x[0].lower(),
-            lemmas_conn.execute(query_sql, {"difficulty": difficulty_limit}),
-        )
-    ):
-        lemmas_doc_bin.add(doc)
-    lemmas_doc_bin.to_disk(
-        spacy_doc_path(
-            spacy_model, model_version, lemma_lang, is_kindle, plugin_path, prefs
-        )
+    lemmas = [
+        lemma.lower()
+        for (lemma,) in lemmas_conn.execute(query_sql, {"difficulty": difficulty_limit})
+    ]
+    batch_size = 10000
+    # only run the tokenizer, spaCy sends the batches to the worker processes
+    # and yields the docs in the input order
+    with nlp.select_pipes(disable=nlp.pipe_names):
+        for index, doc in enumerate(
+            nlp.pipe(lemmas, batch_size=batch_size, n_process=prefs["nlp_processes"]),
+            1,
+        ):
+            lemmas_doc_bin.add(doc)
+            keywords.append([token.lower for token in doc])
+            if notifications and index % batch_size == 0:
+                notifications.put((index / len(lemmas), "Creating spaCy docs"))
+    doc_path = spacy_doc_path(
+        spacy_model, model_version, lemma_lang, is_kindle, plugin_path, prefs
+    )
+    lemmas_doc_bin.to_disk(doc_path)
+    # keywords of other difficulty limits are created from the old lemmas
+    for path in doc_path.parent.glob(f"{doc_path.name}_difficulty_*.npz"):
+        path.unlink()
+    save_lemma_keywords(keywords, lemma_keywords_path(doc_path, difficulty_limit))
+    save_lemma_index(
+        lemmas_conn,
+        kindle_db_path(plugin_path, lemma_lang, prefs)
+        if is_kindle
+        else wiktionary_db_path(plugin_path, lemma_lang, prefs),
     )
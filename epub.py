@@ -5,13 +5,15 @@ import sqlite3
 import zipfile
 from collections import defaultdict
 from dataclasses import dataclass, field
-from functools import partial
 from html import escape, unescape
 from pathlib import Path
 from typing import Iterator
 from urllib.parse import unquote
 
 try:
+    from .content_filter import ContentFilter, TextNode, tag_before
+    from .job_stats import JobStats
+    from .lemma_index import LemmaIndex
     from .mediawiki import (
         MediaWiki,
         Wikidata,
@@ -21,12 +23,16 @@ try:
     )
     from .utils import CJK_LANGS, Prefs
     from .x_ray_share import (
-        FUZZ_THRESHOLD,
         CustomXDict,
+        EntityResolver,
         XRayEntity,
+        cluster_entities,
         is_full_name,
     )
 except ImportError:
+    from content_filter import ContentFilter, TextNode, tag_before
+    from job_stats import JobStats
+    from lemma_index import LemmaIndex
     from mediawiki import (
         MediaWiki,
         Wikidata,
@@ -36,9 +42,10 @@ except ImportError:
     )
     from utils import CJK_LANGS, Prefs
     from x_ray_share import (
-        FUZZ_THRESHOLD,
         CustomXDict,
+        EntityResolver,
         XRayEntity,
+        cluster_entities,
         is_full_name,
     )
 
@@ -82,6 +89,7 @@ class EPUB:
         wikidata: Wikidata | None,
         custom_x_ray: CustomXDict,
         lemmas_conn: sqlite3.Connection | None,
+        lemma_index: LemmaIndex | None,
         prefs: Prefs,
         lemma_lang: str,
     ) -> None:
@@ -91,6 +99,10 @@ class EPUB:
         self.wikidata = wikidata
         self.entity_id = 0
         self.entities: dict[str, XRayEntity] = {}
+        # similar names are merged in modify_epub()
+        self.entity_resolver = (
+            None if prefs["deferred_entity_clustering"] else EntityResolver()
+        )
         self.entity_occurrences: dict[Path, list[Occurrence]] = defaultdict(list)
         self.removed_entity_ids: set[int] = set()
         self.extract_folder = self.book_path.with_name("extract")
@@ -105,11 +117,14 @@ class EPUB:
         self.sense_id_dict: dict[tuple[int, ...], int] = {}
         self.word_wise_id = 0
         self.lemmas_conn: sqlite3.Connection | None = lemmas_conn
+        self.lemma_index = lemma_index
         self.prefs = prefs
         self.lemma_lang = lemma_lang
         self.gloss_lang = prefs["gloss_lang"]
 
-    def extract_epub(self) -> Iterator[tuple[str, tuple[int, int, Path]]]:
+    def extract_epub(
+        self, content_filter: ContentFilter | None = None
+    ) -> Iterator[tuple[str, tuple[int, int, Path]]]:
         from lxml import etree
 
         with zipfile.ZipFile(self.book_path) as zf:
@@ -137,12 +152,25 @@ class EPUB:
                 self.image_href_has_folder = True
                 break
 
+        # EPUB 3 navigation document and EPUB 2 guide reference
+        toc_hrefs = {
+            unquote(item.get("href"))
+            for item in self.opf_root.iterfind("opf:manifest/opf:item", NAMESPACES)
+            if "nav" in item.get("properties", "").split()
+        } | {
+            unquote(reference.get("href", "").split("#")[0])
+            for reference in self.opf_root.iterfind(
+                "opf:guide/opf:reference", NAMESPACES
+            )
+            if reference.get("type") == "toc"
+        }
         for itemref in self.opf_root.iterfind("opf:spine/opf:itemref", NAMESPACES):
             idref = itemref.get("idref")
             item = self.opf_root.find(
                 f'opf:manifest/opf:item[@id="{idref}"]', NAMESPACES
             )
             xhtml_href = unquote(item.get("href"))
+            in_toc = xhtml_href in toc_hrefs
             xhtml_path = self.opf_path.parent.joinpath(xhtml_href)
             if not xhtml_path.exists():
                 xhtml_path = next(self.extract_folder.rglob(xhtml_href))
@@ -161,8 +189,15 @@ class EPUB:
             with xhtml_path.open("w", encoding="utf-8") as f:
                 f.write(xhtml_text)
             for match_body in re.finditer(r"<body.{3,}?</body>", xhtml_text, re.DOTALL):
-                for m in re.finditer(r">[^<]{2,}<", match_body.group(0)):
+                body = match_body.group(0)
+                for m in re.finditer(r">[^<]{2,}<", body):
                     text = m.group(0)[1:-1]
+                    if content_filter is not None and content_filter.skip(
+                        TextNode(
+                            unescape(text), tag_before(body, m.start() + 1), in_toc
+                        )
+                    ):
+                        continue
                     yield (
                         unescape(text),
                         (
@@ -183,33 +218,32 @@ class EPUB:
         word_end: int,
         xhtml_path: Path,
     ) -> None:
-        from rapidfuzz.fuzz import token_set_ratio
-        from rapidfuzz.process import extractOne
-        from rapidfuzz.utils import default_process
-
         if entity_data := self.entities.get(entity_name):
             entity_id = entity_data.id
             entity_data.count += 1
-        elif entity_name not in self.custom_x_ray and (
-            r := extractOne(
-                entity_name,
-                self.entities.keys(),
-                score_cutoff=FUZZ_THRESHOLD,
-                scorer=partial(token_set_ratio, processor=default_process),
-            )
+            self.prefetch_description(entity_name, entity_data)
+        elif (
+            self.entity_resolver is not None
+            and entity_name not in self.custom_x_ray
+            and (matched_name := self.entity_resolver.find(entity_name))
         ):
-            matched_name = r[0]
             matched_entity = self.entities[matched_name]
             matched_entity.count += 1
             entity_id = matched_entity.id
             if is_full_name(matched_name, matched_entity.label, entity_name, ner_label):
                 self.entities[entity_name] = matched_entity
                 del self.entities[matched_name]
+                self.entity_resolver.remove(matched_name)
+                self.entity_resolver.add(entity_name)
+                matched_name = entity_name
+            self.prefetch_description(matched_name, matched_entity)
         else:
             entity_id = self.entity_id
             self.entities[entity_name] = XRayEntity(
                 self.entity_id, book_quote, ner_label, 1
             )
+            if self.entity_resolver is not None:
+                self.entity_resolver.add(entity_name)
             self.entity_id += 1
 
         self.entity_occurrences[xhtml_path].append(
@@ -222,6 +256,13 @@ class EPUB:
             )
         )
 
+    def prefetch_description(self, entity_name: str, entity_data: XRayEntity) -> None:
+        if (
+            self.mediawiki is not None
+            and entity_data.count == self.mediawiki.prefetch_count
+        ):
+            self.mediawiki.prefetch(entity_name)
+
     def add_lemma(
         self,
         lemma: str,
@@ -268,31 +309,51 @@ class EPUB:
                 del self.entities[entity_name]
                 self.removed_entity_ids.add(entity_data.id)
 
-    def modify_epub(self, preview_x_path: Path | None) -> None:
+    def cluster_entities(self, job_stats: JobStats) -> None:
+        merged_ids = cluster_entities(self.entities, self.custom_x_ray)
+        for occurrences in self.entity_occurrences.values():
+            for occurrence in occurrences:
+                if occurrence.entity_id in merged_ids:
+                    occurrence.entity_id = merged_ids[occurrence.entity_id]
+        job_stats.count("clustered_entities", len(merged_ids))
+
+    def modify_epub(self, preview_x_path: Path | None, job_stats: JobStats) -> None:
         if len(self.entities) > 0:
-            if self.mediawiki is not None:
-                self.mediawiki.query(self.entities)
-                if self.wikidata is not None:
-                    query_wikidata(self.entities, self.mediawiki, self.wikidata)
-            if self.prefs["minimal_x_ray_count"] > 1:
-                self.remove_entities(self.prefs["minimal_x_ray_count"])
-            self.create_x_ray_footnotes()
-
-        self.insert_anchor_elements()
-        if len(self.sense_id_dict) > 0:
-            self.create_word_wise_footnotes()
-        self.modify_opf()
-        self.zip_extract_folder()
-        if preview_x_path is not None:
-            self.create_preview_json(preview_x_path)
+            if self.entity_resolver is None:
+                with job_stats.stage("clustering", len(self.entities)):
+                    self.cluster_entities(job_stats)
+            with job_stats.stage("mediawiki"):
+                if self.mediawiki is not None:
+                    self.mediawiki.query(self.entities)
+                    if self.wikidata is not None:
+                        query_wikidata(self.entities, self.mediawiki, self.wikidata)
+            with job_stats.stage("entities"):
+                if self.prefs["minimal_x_ray_count"] > 1:
+                    self.remove_entities(self.prefs["minimal_x_ray_count"])
+            with job_stats.stage("write"):
+                self.create_x_ray_footnotes()
+
+        with job_stats.stage("write"):
+            self.insert_anchor_elements()
+            if len(self.sense_id_dict) > 0:
+                self.create_word_wise_footnotes()
+            self.modify_opf()
+            self.zip_extract_folder()
+            if preview_x_path is not None:
+                self.create_preview_json(preview_x_path)
         if self.mediawiki is not None:
+            self.mediawiki.scheduler.save_stats(job_stats, "mediawiki")
             self.mediawiki.close()
         if self.wikidata is not None:
+            self.wikidata.scheduler.save_stats(job_stats, "wikidata")
             self.wikidata.close()
         if self.wiki_commons is not None:
+            self.wiki_commons.scheduler.save_stats(job_stats, "wikimedia_commons")
             self.wiki_commons.close()
         if self.lemmas_conn is not None:
             self.lemmas_conn.close()
+        if self.lemma_index is not None:
+            self.lemma_index.close()
 
     def insert_anchor_elements(self) -> None:
         css_rules = ""
@@ -551,58 +612,28 @@ class EPUB:
     def find_sense_ids_with_pos(
         self, lemma: str, word: str, pos: str
     ) -> tuple[int, ...]:
-        if self.lemmas_conn is None:
+        if self.lemma_index is None:
             return ()
-        difficulty_limit = self.prefs.get(
-            f"{self.lemma_lang}_wiktionary_difficulty_limit", 5
-        )
-        sense_ids = []
-        for (sense_id,) in self.lemmas_conn.execute(
-            """
-            SELECT id FROM senses
-            WHERE lemma = ? AND pos = ? AND difficulty <= ? AND enabled = 1
-            """,
-            (lemma, pos, difficulty_limit),
-        ):
-            sense_ids.append(sense_id)
-        if len(sense_ids) == 0:
-            for (sense_id,) in self.lemmas_conn.execute(
-                """
-                SELECT DISTINCT s.id
-                FROM senses s JOIN forms f ON s.form_group_id = f.form_group_id
-                WHERE form = ? AND pos = ? AND difficulty <= ? AND enabled = 1
-                """,
-                (word, pos, difficulty_limit),
-            ):
-                sense_ids.append(sense_id)
-
-        return tuple(sense_ids)
+        return self.filter_sense_ids(
+            self.lemma_index.get("l", lemma, pos)
+        ) or self.filter_sense_ids(self.lemma_index.get("f", word, pos))
 
     def find_sense_ids_without_pos(self, word: str) -> tuple[int, ...]:
-        if self.lemmas_conn is None:
+        if self.lemma_index is None:
             return ()
+        return self.filter_sense_ids(
+            self.lemma_index.get("L", word)
+        ) or self.filter_sense_ids(self.lemma_index.get("F", word))
+
+    def filter_sense_ids(self, senses: list[tuple[int, int]]) -> tuple[int, ...]:
         difficulty_limit = self.prefs.get(
             f"{self.lemma_lang}_wiktionary_difficulty_limit", 5
         )
-        sense_ids = []
-        for (sense_id,) in self.lemmas_conn.execute(
-            "SELECT id FROM senses WHERE lemma = ? AND difficulty <= ? AND enabled = 1",
-            (word, difficulty_limit),
-        ):
-            sense_ids.append(sense_id)
-        if len(sense_ids) > 0:
-            return tuple(sense_ids)
-        for (sense_id,) in self.lemmas_conn.execute(
-            """
-            SELECT DISTINCT s.id
-            FROM senses s JOIN forms f ON s.form_group_id = f.form_group_id
-            WHERE form = ? AND difficulty <= ? AND enabled = 1
-            """,
-            (word, difficulty_limit),
-        ):
-            sense_ids.append(sense_id)
-
-        return tuple(sense_ids)
+        return tuple(
+            sense_id
+            for difficulty, sense_id in senses
+            if difficulty <= difficulty_limit
+        )
 
     def get_sense_data(self, sense_ids: tuple[int, ...]) -> list[Sense]:
         if self.lemmas_conn is None:
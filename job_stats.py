@@ -0,0 +1,123 @@
+import json
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass
+class StageStats:
+    wall: float = 0.0
+    cpu: float = 0.0
+    calls: int = 0
+    items: int = 0
+
+
+class JobStats:
+    """
+    Record wall time, CPU time and item counts of the stages of a job.
+    Stages can be nested, time spent in the inner stage is not counted in
+    the outer stage.
+    """
+
+    def __init__(self) -> None:
+        self.stages: dict[str, StageStats] = {}
+        self.counters: dict[str, int] = {}
+        self.stack: list[str] = []
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+        self.last_wall = self.start_wall
+        self.last_cpu = self.start_cpu
+
+    def charge_current_stage(self) -> None:
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        if len(self.stack) > 0:
+            stats = self.stages[self.stack[-1]]
+            stats.wall += wall - self.last_wall
+            stats.cpu += cpu - self.last_cpu
+        self.last_wall = wall
+        self.last_cpu = cpu
+
+    @contextmanager
+    def stage(self, name: str, items: int = 0) -> Iterator[StageStats]:
+        self.charge_current_stage()
+        stats = self.stages.setdefault(name, StageStats())
+        stats.calls += 1
+        stats.items += items
+        self.stack.append(name)
+        try:
+            yield stats
+        finally:
+            self.charge_current_stage()
+            self.stack.pop()
+
+    def wrap(self, name: str, iterable: Iterable[T]) -> Iterator[T]:
+        """
+        Count the time used to produce each item of a generator in the stage.
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name) as stats:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                stats.items += 1
+            yield item
+
+    def count(self, name: str, value: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def count_cache(self, name: str, cached_func: Any) -> None:
+        """
+        Count hits and misses of a functools.lru_cache() function.
+        """
+        info = cached_func.cache_info()
+        self.count(f"{name}_hits", info.hits)
+        self.count(f"{name}_misses", info.misses)
+        if info.hits + info.misses > 0:
+            self.count(
+                f"{name}_hit_percent",
+                round(info.hits * 100 / (info.hits + info.misses)),
+            )
+
+    def report(self) -> dict[str, Any]:
+        total_wall = time.perf_counter() - self.start_wall
+        total_cpu = time.process_time() - self.start_cpu
+        stages = {
+            name: {
+                "wall_seconds": round(stats.wall, 6),
+                "cpu_seconds": round(stats.cpu, 6),
+                "calls": stats.calls,
+                "items": stats.items,
+            }
+            for name, stats in self.stages.items()
+        }
+        stages["other"] = {
+            "wall_seconds": round(
+                total_wall - sum(x.wall for x in self.stages.values()), 6
+            ),
+            "cpu_seconds": round(
+                total_cpu - sum(x.cpu for x in self.stages.values()), 6
+            ),
+            "calls": 0,
+            "items": 0,
+        }
+        return {
+            "wall_seconds": round(total_wall, 6),
+            "cpu_seconds": round(total_cpu, 6),
+            "stages": stages,
+            "counters": self.counters,
+        }
+
+    def save(self, path: Path) -> None:
+        with path.open("w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2)
+
+
+def get_job_stats_path(book_path: str | Path, book_fmt: str) -> Path:
+    return Path(book_path).with_name(f"worddumb-job-stats-{book_fmt.lower()}.json")
@@ -0,0 +1,157 @@
+"""
+Read-only lookup file of the enabled senses in a Kindle or Wiktionary lemmas
+database. Jobs open it with mmap so the workers share the same page cache
+instead of running SQL joins for every matched word.
+
+File layout (little-endian):
+header: magic, database size and mtime, key count
+offsets of the records, sorted by the key bytes
+records: key length, key, sense count, (difficulty, sense id) pairs
+
+The key is the lookup type, the text and POS joined with NUL:
+"l": lemma and POS, "f": inflected form and POS,
+"L": lemma, "F": inflected form
+"""
+
+import mmap
+import os
+import sqlite3
+import struct
+import tempfile
+from pathlib import Path
+
+MAGIC = b"WDLI0001"
+HEADER = struct.Struct("<8sqqI")
+OFFSET = struct.Struct("<Q")
+LENGTH = struct.Struct("<I")
+SENSE = struct.Struct("<iq")
+
+
+def lemma_index_path(db_path: Path) -> Path:
+    return db_path.with_suffix(".index")
+
+
+def db_signature(db_path: Path) -> tuple[int, int]:
+    # downloaded databases could have an older mtime, also compare the size
+    stat = db_path.stat()
+    return stat.st_size, stat.st_mtime_ns
+
+
+def build_lemma_index(conn: sqlite3.Connection, db_path: Path) -> bytes:
+    senses: dict[bytes, list[tuple[int, int]]] = {}
+    for lemma, pos, difficulty, sense_id in conn.execute(
+        """
+        SELECT lemma, pos, difficulty, id FROM senses
+        WHERE enabled = 1 AND lemma IS NOT NULL AND difficulty IS NOT NULL
+        """
+    ):
+        add_sense(senses, "l", lemma, pos or "", difficulty, sense_id)
+        add_sense(senses, "L", lemma, "", difficulty, sense_id)
+    for form, pos, difficulty, sense_id in conn.execute(
+        """
+        SELECT DISTINCT form, pos, difficulty, s.id
+        FROM senses s JOIN forms f ON s.form_group_id = f.form_group_id
+        WHERE enabled = 1 AND form IS NOT NULL AND difficulty IS NOT NULL
+        """
+    ):
+        add_sense(senses, "f", form, pos or "", difficulty, sense_id)
+        add_sense(senses, "F", form, "", difficulty, sense_id)
+
+    records = bytearray()
+    offsets = []
+    records_start = HEADER.size + OFFSET.size * len(senses)
+    for key in sorted(senses):
+        offsets.append(records_start + len(records))
+        values = sorted(set(senses[key]), key=lambda x: x[1])
+        records += LENGTH.pack(len(key)) + key + LENGTH.pack(len(values))
+        for value in values:
+            records += SENSE.pack(*value)
+
+    return (
+        HEADER.pack(MAGIC, *db_signature(db_path), len(senses))
+        + b"".join(OFFSET.pack(offset) for offset in offsets)
+        + records
+    )
+
+
+def add_sense(
+    senses: dict[bytes, list[tuple[int, int]]],
+    key_type: str,
+    text: str,
+    pos: str,
+    difficulty: int,
+    sense_id: int,
+) -> None:
+    key = f"{key_type}{text}\0{pos}".encode("utf-8")
+    senses.setdefault(key, []).append((difficulty, sense_id))
+
+
+def save_lemma_index(conn: sqlite3.Connection, db_path: Path) -> bytes:
+    index_bytes = build_lemma_index(conn, db_path)
+    index_path = lemma_index_path(db_path)
+    # jobs run in threads of the same process, each one needs a unique file
+    with tempfile.NamedTemporaryFile(
+        dir=index_path.parent, prefix=f"{index_path.name}.", suffix=".tmp", delete=False
+    ) as f:
+        f.write(index_bytes)
+        tmp_path = Path(f.name)
+    try:
+        os.replace(tmp_path, index_path)
+    except OSError:
+        # Windows can't replace the file while another job has it mapped
+        tmp_path.unlink(missing_ok=True)
+    return index_bytes
+
+
+def open_lemma_index(conn: sqlite3.Connection, db_path: Path) -> "LemmaIndex":
+    index_path = lemma_index_path(db_path)
+    if index_path.exists():
+        with index_path.open("rb") as f:
+            header = f.read(HEADER.size)
+            if len(header) == HEADER.size and HEADER.unpack(header)[:3] == (
+                MAGIC,
+                *db_signature(db_path),
+            ):
+                return LemmaIndex(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    return LemmaIndex(save_lemma_index(conn, db_path))
+
+
+class LemmaIndex:
+    def __init__(self, buffer: mmap.mmap | bytes) -> None:
+        self.buffer = buffer
+        self.key_count = HEADER.unpack_from(buffer)[3]
+
+    def key_at(self, index: int) -> tuple[bytes, int]:
+        (offset,) = OFFSET.unpack_from(self.buffer, HEADER.size + OFFSET.size * index)
+        (key_len,) = LENGTH.unpack_from(self.buffer, offset)
+        key_start = offset + LENGTH.size
+        return self.buffer[key_start : key_start + key_len], key_start + key_len
+
+    def get(self, key_type: str, text: str, pos: str = "") -> list[tuple[int, int]]:
+        """
+        Return (difficulty, sense id) pairs sorted by sense id.
+        """
+        key = f"{key_type}{text}\0{pos}".encode("utf-8")
+        low = 0
+        high = self.key_count
+        while low < high:
+            middle = (low + high) // 2
+            if self.key_at(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self.key_count:
+            return []
+        found_key, values_offset = self.key_at(low)
+        if found_key != key:
+            return []
+        (count,) = LENGTH.unpack_from(self.buffer, values_offset)
+        values_offset += LENGTH.size
+        return [
+            SENSE.unpack_from(self.buffer, values_offset + SENSE.size * index)
+            for index in range(count)
+        ]
+
+    def close(self) -> None:
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
@@ -4,19 +4,25 @@ from dataclasses import dataclass
 from datetime import datetime, timezone
 from functools import partial
 from pathlib import Path
-from typing import TypedDict
+from typing import Any, TypedDict
 from urllib.parse import unquote
 
 try:
+    from .request_scheduler import MAXLAG_SECONDS, RequestScheduler
     from .utils import get_mediawiki_db_path
     from .x_ray_share import FUZZ_THRESHOLD, XRayEntity
 except ImportError:
+    from request_scheduler import MAXLAG_SECONDS, RequestScheduler
     from utils import get_mediawiki_db_path
     from x_ray_share import FUZZ_THRESHOLD, XRayEntity
 
 # https://www.mediawiki.org/wiki/API:Get_the_contents_of_a_page
 # https://www.mediawiki.org/wiki/Extension:TextExtracts#API
 MEDIAWIKI_API_EXLIMIT = 20
+# https://www.mediawiki.org/wiki/API:Etiquette
+MAX_MEDIAWIKI_REQUESTS = 8
+# prefetch descriptions of entities appear this many times while parsing
+PREFETCH_ENTITY_COUNT = 3
 
 GPE_LABELS = frozenset(["GPE", "GPE_LOC", "GPE_ORG", "placeName", "LC"])
 
@@ -35,14 +41,24 @@ class MediaWiki:
         useragent: str,
         plugin_path: Path,
         lang_variant: str,
+        max_requests: int = 1,
+        prefetch: bool = False,
     ) -> None:
         self.lang = lang
+        # number of concurrent extract requests
+        self.max_requests = max(1, min(max_requests, MAX_MEDIAWIKI_REQUESTS))
+        self.prefetch_count = PREFETCH_ENTITY_COUNT if prefetch else 0
+        self.prefetch_executor: Any = None
+        self.prefetch_titles: set[str] = set()
+        self.prefetch_batch: set[str] = set()
+        self.prefetch_futures: list[tuple[set[str], Any]] = []
         self.is_wikipedia = api_url == ""
         self.api_url = (
             f"https://{lang}.wikipedia.org/w/api.php" if api_url == "" else api_url
         )
         self.db_conn = self.init_db(get_mediawiki_db_path(lang, api_url, plugin_path))
         self.session = self.init_requests_session(useragent, lang_variant)
+        self.scheduler = RequestScheduler(self.session, self.max_requests)
         self.sitename = "Wikipedia" if self.is_wikipedia else ""
         self.has_extracts_api = True if self.is_wikipedia else False
         self.has_tocdata_api = True if self.is_wikipedia else False
@@ -69,13 +85,26 @@ class MediaWiki:
 
     def init_requests_session(self, useragent: str, lang_variant: str):
         import requests
+        from requests.adapters import HTTPAdapter
 
         session = requests.Session()
+        # keep a connection alive for each concurrent request, responses are
+        # gzip compressed by default
+        adapter = HTTPAdapter(pool_maxsize=self.max_requests)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
         session.headers.update({"user-agent": useragent})
-        session.params = {"format": "json", "formatversion": 2, "variant": lang_variant}
+        session.params = {
+            "format": "json",
+            "formatversion": 2,
+            "variant": lang_variant,
+            "maxlag": MAXLAG_SECONDS,
+        }
         return session
 
     def close(self):
+        if self.prefetch_executor is not None:
+            self.prefetch_executor.shutdown(cancel_futures=True)
         self.session.close()
         self.db_conn.commit()
         self.db_conn.execute("PRAGMA optimize")
@@ -83,7 +112,7 @@ class MediaWiki:
 
     def get_api_info(self) -> None:
         # https://www.mediawiki.org/wiki/API:Siteinfo
-        result = self.session.get(
+        result = self.scheduler.get(
             self.api_url,
             params={"action": "query", "meta": "siteinfo", "siprop": "general"},
         )
@@ -92,7 +121,7 @@ class MediaWiki:
             self.sitename = data.get("query", {}).get("general", {}).get("sitename", "")
 
         # https://www.mediawiki.org/wiki/API:Parameter_information
-        result = self.session.get(
+        result = self.scheduler.get(
             self.api_url, params={"action": "paraminfo", "modules": "query+extracts"}
         )
         if result.ok:
@@ -100,7 +129,7 @@ class MediaWiki:
             for module in data.get("paraminfo", {}).get("modules", []):
                 if module.get("name", "") == "extracts":
                     self.has_extracts_api = True
-        result = self.session.get(
+        result = self.scheduler.get(
             self.api_url, params={"action": "paraminfo", "modules": "parse"}
         )
         if result.ok:
@@ -197,8 +226,14 @@ class MediaWiki:
         return ""
 
     def query_extracts_api(self, titles: set[str]) -> None:
+        self.apply_extracts(self.fetch_extracts(titles), titles)
+
+    def fetch_extracts(self, titles: set[str]) -> Any:
+        """
+        Send the extracts API request, could be called in other threads.
+        """
         # https://www.mediawiki.org/wiki/Extension:TextExtracts#API
-        result = self.session.get(
+        result = self.scheduler.get(
             self.api_url,
             params={
                 "action": "query",
@@ -211,8 +246,15 @@ class MediaWiki:
             },
         )
         if not result.ok:
+            return None
+        return result.json()
+
+    def apply_extracts(self, data: Any, titles: set[str]) -> None:
+        """
+        Save the extracts API response to the database.
+        """
+        if data is None:
             return
-        data = result.json()
         converts = defaultdict(list)
         redirect_to_sections: dict[str, dict[str, str]] = defaultdict(dict)
         for convert_type in ["normalized", "redirects"]:
@@ -261,7 +303,7 @@ class MediaWiki:
         from lxml import etree
 
         for page, section_to_titles in redirect_to_sections.items():
-            r = self.session.get(
+            r = self.scheduler.get(
                 self.api_url,
                 params={
                     "action": "parse",
@@ -276,7 +318,7 @@ class MediaWiki:
                 "tocdata" if self.has_tocdata_api else "sections", {}
             ).get("sections", []):
                 if section["anchor"] in section_to_titles:
-                    r = self.session.get(
+                    r = self.scheduler.get(
                         self.api_url,
                         params={
                             "action": "parse",
@@ -319,7 +361,7 @@ class MediaWiki:
 
         # some wikis don't have TextExtract extension
         # https://www.mediawiki.org/wiki/API:Parse
-        result = self.session.get(
+        result = self.scheduler.get(
             self.api_url,
             params={
                 "action": "parse",
@@ -376,24 +418,75 @@ class MediaWiki:
         else:
             self.add_no_desc_titles({page})
 
+    def prefetch(self, title: str) -> None:
+        """
+        Request the description in the background while the book is parsed,
+        the response is saved to the database in `query()`.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        if (
+            not self.has_extracts_api
+            or title in self.prefetch_titles
+            or self.has_cache(title)
+            or self.get_redirect_section(title) is not None
+        ):
+            return
+        self.prefetch_titles.add(title)
+        self.prefetch_batch.add(title)
+        if len(self.prefetch_batch) == MEDIAWIKI_API_EXLIMIT:
+            if self.prefetch_executor is None:
+                self.prefetch_executor = ThreadPoolExecutor(self.max_requests)
+            titles = self.prefetch_batch
+            self.prefetch_futures.append(
+                (titles, self.prefetch_executor.submit(self.fetch_extracts, titles))
+            )
+            self.prefetch_batch = set()
+
+    def apply_prefetched_extracts(self) -> None:
+        import requests
+
+        # titles of the last incomplete batch are requested in query()
+        self.prefetch_batch.clear()
+        for titles, future in self.prefetch_futures:
+            try:
+                data = future.result()
+            except requests.RequestException:
+                continue  # request again in query()
+            self.apply_extracts(data, titles)
+        self.prefetch_futures.clear()
+
     def query(self, entities: dict[str, XRayEntity]) -> None:
-        pending_entities: set[str] = set()
-        for entity, entity_data in entities.items():
-            if self.has_extracts_api and len(pending_entities) == MEDIAWIKI_API_EXLIMIT:
-                self.query_extracts_api(pending_entities)
-                pending_entities.clear()
-            elif not self.has_cache(entity):
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.apply_prefetched_extracts()
+        batches: list[set[str]] = []
+        for entity in entities:
+            if not self.has_cache(entity):
                 if redirect_data := self.get_redirect_section(entity):
                     redirect_to, redirect_fragment = redirect_data
                     self.get_section_text(
                         {redirect_to: {redirect_fragment: entity}}, {}, set()
                     )
                 elif self.has_extracts_api:
-                    pending_entities.add(entity)
+                    if len(batches) == 0 or len(batches[-1]) == MEDIAWIKI_API_EXLIMIT:
+                        batches.append(set())
+                    batches[-1].add(entity)
                 else:
                     self.query_parse_api(entity)
-        if len(pending_entities) > 0:
-            self.query_extracts_api(pending_entities)
+        if len(batches) == 0:
+            return
+        if self.max_requests == 1 or len(batches) == 1:
+            for titles in batches:
+                self.query_extracts_api(titles)
+            return
+        # only send requests in other threads, responses are saved to the
+        # database in the order of the batches
+        with ThreadPoolExecutor(self.max_requests) as executor:
+            for titles, data in zip(
+                batches, executor.map(self.fetch_extracts, batches)
+            ):
+                self.apply_extracts(data, titles)
 
 
 class Wikimedia_Commons:
@@ -402,6 +495,7 @@ class Wikimedia_Commons:
 
         self.session = requests.Session()
         self.session.headers.update({"user-agent": useragent})
+        self.scheduler = RequestScheduler(self.session)
         self.cache_folder = plugin_path.parent.joinpath("worddumb-wikimedia")
 
     def get_image(self, filename: str) -> Path | None:
@@ -411,7 +505,7 @@ class Wikimedia_Commons:
         return file_path
 
     def download_image(self, filename: str, file_path: Path) -> bool:
-        r = self.session.get(
+        r = self.scheduler.get(
             f"https://commons.wikimedia.org/wiki/Special:FilePath/{filename}"
         )
         if not r.ok:
@@ -435,6 +529,7 @@ class Wikidata:
 
         self.session = requests.Session()
         self.session.headers.update({"user-agent": useragent})
+        self.scheduler = RequestScheduler(self.session)
 
         cache_db_path = plugin_path.parent.joinpath("worddumb-wikimedia/wikidata.db")
         if not cache_db_path.parent.is_dir():
@@ -488,7 +583,7 @@ class Wikidata:
         }}
         GROUP BY ?item
         """
-        result = self.session.get(
+        result = self.scheduler.get(
             "https://query.wikidata.org/sparql",
             params={"query": query, "format": "json"},
         )
@@ -0,0 +1,227 @@
+"""
+Long-lived Python process that keeps the spaCy pipeline and the lemma matcher
+loaded between jobs, so creating files for many books only pays the spaCy
+import and model loading cost once.
+
+Each request is a JSON line followed by the book text bytes, the worker
+replies with JSON lines: progress notifications then "done" or "error".
+"""
+
+import json
+import subprocess
+import threading
+from collections import deque
+from typing import IO, Any
+
+# worker exits if no job is received in this many seconds
+NLP_WORKER_IDLE_TIMEOUT = 600
+
+
+class NLPWorker:
+    def __init__(self, args: list[str]) -> None:
+        self.args = args
+        self.lock = threading.Lock()
+        self.process: subprocess.Popen[bytes] | None = None
+        self.stderr_thread: threading.Thread | None = None
+        self.stderr_lines: deque[bytes] = deque(maxlen=200)
+
+    def start(self) -> None:
+        try:
+            from .utils import start_subprocess
+        except ImportError:
+            from utils import start_subprocess
+
+        self.process = start_subprocess(self.args)
+        self.stderr_lines.clear()
+        self.stderr_thread = threading.Thread(
+            target=self.read_stderr, args=(self.process.stderr,), daemon=True
+        )
+        self.stderr_thread.start()
+
+    def read_stderr(self, stderr: IO[bytes]) -> None:
+        # drain stderr otherwise the worker blocks when the pipe is full
+        for line in stderr:
+            self.stderr_lines.append(line)
+
+    def run_job(
+        self,
+        job_data: str,
+        prefs: str,
+        input_bytes: bytes | None,
+        notifications: Any,
+    ) -> int:
+        """
+        Return the number of words parsed.
+        """
+        input_bytes = input_bytes or b""
+        header = json.dumps(
+            {"job_data": job_data, "prefs": prefs, "input_length": len(input_bytes)}
+        )
+        with self.lock:
+            # the worker could exit because of idle timeout right before
+            # receiving the job, start a new one and try again
+            for _ in range(2):
+                if self.process is None or self.process.poll() is not None:
+                    self.start()
+                word_count = self.send_job(
+                    header.encode("utf-8"), input_bytes, notifications
+                )
+                if word_count is not None:
+                    return word_count
+
+            assert self.process is not None
+            returncode = self.process.wait()
+            if self.stderr_thread is not None:
+                self.stderr_thread.join(1)
+            raise subprocess.CalledProcessError(
+                returncode, self.args, stderr=b"".join(self.stderr_lines)
+            )
+
+    def send_job(
+        self, header: bytes, input_bytes: bytes, notifications: Any
+    ) -> int | None:
+        assert self.process is not None
+        assert self.process.stdin is not None
+        assert self.process.stdout is not None
+        try:
+            self.process.stdin.write(header + b"\n")
+            self.process.stdin.write(input_bytes)
+            self.process.stdin.flush()
+        except OSError:
+            return None
+
+        finished = False
+        try:
+            for line in self.process.stdout:
+                try:
+                    message = json.loads(line)
+                except json.JSONDecodeError:
+                    raise subprocess.CalledProcessError(
+                        1, self.args, stderr=b"Invalid worker message: " + line
+                    )
+                if "progress" in message:
+                    if notifications:
+                        notifications.put(tuple(message["progress"]))
+                elif "error" in message:
+                    finished = True
+                    raise subprocess.CalledProcessError(
+                        1, self.args, stderr=message["error"].encode("utf-8")
+                    )
+                elif "words" in message:
+                    finished = True
+                    return message["words"]
+                else:
+                    raise subprocess.CalledProcessError(
+                        1, self.args, stderr=b"Invalid worker message: " + line
+                    )
+            return None
+        finally:
+            if not finished:
+                # the worker could still be sending messages of this job,
+                # the next job starts a new worker
+                self.stop()
+
+    def stop(self) -> None:
+        assert self.process is not None
+        self.process.kill()
+        self.process.wait()
+
+
+NLP_WORKERS: dict[tuple[str, str, str, int], NLPWorker] = {}
+NLP_WORKERS_LOCK = threading.Lock()
+
+
+def run_nlp_job(
+    py_path: str,
+    plugin_path: str,
+    model: str,
+    worker_id: int,
+    job_data: str,
+    prefs: str,
+    input_bytes: bytes | None,
+    notifications: Any,
+) -> int:
+    key = (py_path, plugin_path, model, worker_id)
+    with NLP_WORKERS_LOCK:
+        worker = NLP_WORKERS.get(key)
+        if worker is None:
+            worker = NLPWorker([py_path, "-I", plugin_path, "--worker"])
+            NLP_WORKERS[key] = worker
+    return worker.run_job(job_data, prefs, input_bytes, notifications)
+
+
+class WorkerNotifications:
+    def __init__(self, output: IO[bytes]) -> None:
+        self.output = output
+
+    def put(self, progress: tuple[float, str]) -> None:
+        send_message(self.output, {"progress": progress})
+
+
+def send_message(output: IO[bytes], message: dict[str, Any]) -> None:
+    output.write(json.dumps(message).encode("utf-8") + b"\n")
+    output.flush()
+
+
+def private_stdout() -> IO[bytes]:
+    """
+    Return a private copy of stdout for the protocol messages, fd 1 is replaced
+    with stderr so text written by C code or spaCy child processes can't mix
+    with the messages.
+    """
+    import os
+    import sys
+
+    sys.stdout.flush()
+    output = os.fdopen(os.dup(1), "wb")
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+    return output
+
+
+def serve() -> None:
+    import os
+    import queue
+    import sys
+    import traceback
+
+    from parse_job import ParseJobData, SpacyCache, create_files
+
+    output = private_stdout()
+    requests: queue.Queue[tuple[dict[str, Any], bytes] | None] = queue.Queue()
+
+    def read_requests() -> None:
+        while line := sys.stdin.buffer.readline():
+            header = json.loads(line)
+            requests.put((header, sys.stdin.buffer.read(header["input_length"])))
+        requests.put(None)  # calibre exited
+
+    threading.Thread(target=read_requests, daemon=True).start()
+    spacy_cache = SpacyCache()
+    notifications = WorkerNotifications(output)
+    while True:
+        try:
+            request = requests.get(timeout=NLP_WORKER_IDLE_TIMEOUT)
+        except queue.Empty:
+            break
+        if request is None:
+            break
+
+        header, input_bytes = request
+        try:
+            data = ParseJobData(**json.loads(header["job_data"]))
+            if data.book_fmt == "KFX":
+                data.kfx_json = json.loads(input_bytes)
+            elif data.book_fmt != "EPUB":
+                data.mobi_html = input_bytes
+            word_count = create_files(
+                data, json.loads(header["prefs"]), notifications, spacy_cache
+            )
+        except Exception:
+            send_message(output, {"error": traceback.format_exc()})
+        else:
+            send_message(output, {"done": True, "words": word_count})
+
+    # the request reader thread is still blocked on stdin, normal interpreter
+    # shutdown would abort while waiting for the stdin lock
+    os._exit(0)
@@ -1,24 +1,34 @@
+import codecs
+import hashlib
 import json
 import random
 import re
 import shutil
 import sqlite3
+import threading
+from collections import deque
 from dataclasses import asdict, dataclass, field
+from functools import lru_cache
 from html import escape, unescape
+from itertools import accumulate
 from pathlib import Path
-from sqlite3 import Connection
-from typing import Any, Iterator
+from typing import Any, Callable, Iterator
 
 try:
     from calibre.constants import isfrozen
 
+    from .content_filter import (
+        ContentFilter,
+        TextNode,
+        mobi_tag_before,
+        mobi_toc_range,
+    )
     from .database import (
+        GlossWriter,
         create_lang_layer,
         create_x_ray_db,
         get_ll_path,
         get_x_ray_path,
-        insert_lemma,
-        save_db,
     )
     from .deps import (
         download_wikipedia_titles_db,
@@ -26,11 +36,22 @@ try:
         install_deps,
         which_python,
     )
-    from .dump_lemmas import save_spacy_docs, spacy_doc_path
+    from .dump_lemmas import (
+        lemma_keywords_path,
+        lemmas_difficulty_limit,
+        load_lemma_keywords,
+        save_lemma_keywords,
+        save_spacy_docs,
+        spacy_doc_path,
+    )
     from .epub import EPUB, spacy_to_wiktionary_pos
     from .interval import Interval, IntervalTree
+    from .job_stats import JobStats, get_job_stats_path
+    from .lemma_index import LemmaIndex, open_lemma_index
     from .mediawiki import MediaWiki, Wikidata, Wikimedia_Commons
     from .metadata import KFXJson
+    from .nlp_worker import run_nlp_job
+    from .token_matcher import TokenMatcher
     from .utils import (
         CJK_LANGS,
         Prefs,
@@ -43,7 +64,6 @@ try:
         insert_installed_libs,
         kindle_db_path,
         load_plugin_json,
-        run_subprocess,
         spacy_model_name,
         use_kindle_ww_db,
         wiktionary_db_path,
@@ -57,19 +77,34 @@ try:
     )
 except ImportError:
     isfrozen = False
+    from content_filter import (
+        ContentFilter,
+        TextNode,
+        mobi_tag_before,
+        mobi_toc_range,
+    )
     from database import (
+        GlossWriter,
         create_lang_layer,
         create_x_ray_db,
         get_ll_path,
         get_x_ray_path,
-        insert_lemma,
-        save_db,
     )
-    from dump_lemmas import save_spacy_docs, spacy_doc_path
+    from dump_lemmas import (
+        lemma_keywords_path,
+        lemmas_difficulty_limit,
+        load_lemma_keywords,
+        save_lemma_keywords,
+        save_spacy_docs,
+        spacy_doc_path,
+    )
     from epub import EPUB, spacy_to_wiktionary_pos
     from interval import Interval, IntervalTree
+    from job_stats import JobStats, get_job_stats_path
+    from lemma_index import LemmaIndex, open_lemma_index
     from mediawiki import MediaWiki, Wikidata, Wikimedia_Commons
     from metadata import KFXJson
+    from token_matcher import TokenMatcher
     from utils import (
         CJK_LANGS,
         Prefs,
@@ -109,6 +144,31 @@ class ParseJobData:
     mobi_codec: str = ""
     book_settings: dict[str, str] = field(default_factory=dict)
     after_preview_x_ray: bool = False
+    word_count: int = 0
+
+
+@dataclass
+class SpacyCache:
+    """
+    Loaded spaCy pipelines and lemma matchers kept by the NLP worker process
+    between jobs.
+    """
+
+    pipelines: dict[tuple[str, bool, bool], Any] = field(default_factory=dict)
+    matchers: dict[tuple[int, str, int, str], Any] = field(default_factory=dict)
+
+
+# spaCy pipelines of the CLI batch mode workers that run in calibre's process
+SPACY_CACHES: dict[int, SpacyCache] = {}
+# pip can't install packages to the same folder at the same time
+INSTALL_DEPS_LOCK = threading.Lock()
+# jobs of the same language run in several lanes, only one of them downloads
+# and extracts a file
+DOWNLOAD_LOCKS: dict[str, threading.Lock] = {}
+
+
+def download_lock(filename: str) -> threading.Lock:
+    return DOWNLOAD_LOCKS.setdefault(filename, threading.Lock())
 
 
 def do_job(
@@ -116,7 +176,12 @@ def do_job(
     abort: Any = None,
     log: Any = None,
     notifications: Any = None,
+    worker_id: int | None = None,
 ) -> ParseJobData:
+    """
+    Jobs with the same `worker_id` run one after another and share the loaded
+    spaCy model, the default `None` uses the NLP worker shared by GUI jobs.
+    """
     from .config import prefs
     from .metadata import get_asin_etc
 
@@ -155,13 +220,14 @@ def do_job(
         data.create_ww = data.create_ww and not new_epub_path.exists()
         shutil.copy(data.book_path, new_epub_path)
         data.book_path = str(new_epub_path)
-        if (
-            data.create_ww
-            and not wiktionary_db_path(data.plugin_path, data.book_lang, prefs).exists()
-        ):
-            download_word_wise_file(
-                False, data.book_lang, prefs, notifications=notifications
-            )
+        if data.create_ww:
+            with download_lock(f"{data.book_lang}_{prefs['gloss_lang']}"):
+                if not wiktionary_db_path(
+                    data.plugin_path, data.book_lang, prefs
+                ).exists():
+                    download_word_wise_file(
+                        False, data.book_lang, prefs, notifications=notifications
+                    )
     else:
         data.create_ww = (
             data.create_ww and not get_ll_path(data.asin, data.book_path).exists()
@@ -170,15 +236,17 @@ def do_job(
             data.after_preview_x_ray
             or not get_x_ray_path(data.asin, data.book_path).exists()
         )
-        if data.create_ww and (
-            not kindle_db_path(data.plugin_path, data.book_lang, prefs).exists()
-            or not get_wiktionary_klld_path(
-                data.plugin_path, data.book_lang, prefs
-            ).exists()
-        ):
-            download_word_wise_file(
-                True, data.book_lang, prefs, notifications=notifications
-            )
+        if data.create_ww:
+            with download_lock(f"{data.book_lang}_{prefs['gloss_lang']}"):
+                if (
+                    not kindle_db_path(data.plugin_path, data.book_lang, prefs).exists()
+                    or not get_wiktionary_klld_path(
+                        data.plugin_path, data.book_lang, prefs
+                    ).exists()
+                ):
+                    download_word_wise_file(
+                        True, data.book_lang, prefs, notifications=notifications
+                    )
 
     if not data.create_ww and not data.create_x:
         return data
@@ -187,22 +255,26 @@ def do_job(
         data.book_fmt == "EPUB" or data.create_x
     ):
         # parse MediaWiki page and Wikipedia section requires lxml
-        install_deps("lxml", notifications)
-    install_deps(data.spacy_model, notifications)
+        with INSTALL_DEPS_LOCK:
+            install_deps("lxml", notifications)
+    with INSTALL_DEPS_LOCK:
+        install_deps(data.spacy_model, notifications)
 
     if data.create_x and data.book_settings.get("mediawiki_api", "") == "":
         mediawiki_db_path = get_mediawiki_db_path(data.book_lang, "", data.plugin_path)
-        if not mediawiki_db_path.exists():
-            download_wikipedia_titles_db(mediawiki_db_path, notifications)
+        with download_lock(mediawiki_db_path.name):
+            if not mediawiki_db_path.exists():
+                download_wikipedia_titles_db(mediawiki_db_path, notifications)
 
     if notifications:
         notifications.put((0, "Creating files"))
 
-    copy_custom_x_pref = prefs["custom_entity_only"]
+    # jobs run in parallel, don't change the global preferences
+    job_prefs: Prefs = json.loads(dump_prefs(prefs))
     if data.after_preview_x_ray:
-        prefs["custom_entity_only"] = True
+        job_prefs["custom_entity_only"] = True
     elif len(load_custom_x_desc(data.book_path)) == 0:
-        prefs["custom_entity_only"] = False
+        job_prefs["custom_entity_only"] = False
     restore_job_data = (
         data.create_x and prefs["preview_x_ray"] and not data.after_preview_x_ray
     )
@@ -222,13 +294,7 @@ def do_job(
         data.mobi_html = None
         data.kfx_json = None
         data.plugin_path = str(data.plugin_path)
-        args = [
-            py_path,
-            "-I",  # isolate user env
-            str(data.plugin_path),
-            json.dumps(asdict(data)),
-            dump_prefs(prefs),
-        ]
+        job_data = json.dumps(asdict(data))
         data.mi = copy_mi
         input_str = None
         if data.book_fmt == "KFX":
@@ -238,11 +304,27 @@ def do_job(
         if restore_job_data:
             data.mobi_html = copy_mobi_html
             data.kfx_json = copy_kfx_json
-        run_subprocess(args, input_str)
+        # reuse the worker process that has the spaCy model loaded
+        data.word_count = run_nlp_job(
+            py_path,
+            data.plugin_path,
+            data.spacy_model or data.book_lang,
+            worker_id or 0,
+            job_data,
+            json.dumps(job_prefs),
+            input_str,
+            notifications,
+        )
     else:
-        create_files(data, prefs, notifications)
+        data.word_count = create_files(
+            data,
+            job_prefs,
+            notifications,
+            None
+            if worker_id is None
+            else SPACY_CACHES.setdefault(worker_id, SpacyCache()),
+        )
 
-    prefs["custom_entity_only"] = copy_custom_x_pref
     if restore_job_data:
         data.book_path = origin_book_path
     return data
@@ -260,19 +342,32 @@ def calculate_final_start(data: ParseJobData) -> int:
             return 0
 
 
-def create_files(data: ParseJobData, prefs: Prefs, notif: Any) -> None:
+def create_files(
+    data: ParseJobData,
+    prefs: Prefs,
+    notif: Any,
+    spacy_cache: SpacyCache | None = None,
+) -> int:
     """
     This function runs in system Python subprocess for official(frozen) calibre build.
+    Return the number of words parsed.
     """
     is_epub = data.book_fmt == "EPUB"
+    word_count = 0
+    job_stats = JobStats()
     data.plugin_path = Path(data.plugin_path)
     insert_installed_libs(data.plugin_path)
-    nlp = load_spacy(
-        data.spacy_model,
-        data.book_path if data.create_x else None,
-        data.book_lang,
-    )
+    with job_stats.stage("setup"):
+        nlp = load_spacy(
+            data.spacy_model,
+            data.book_path if data.create_x else None,
+            data.book_lang,
+            spacy_cache,
+            prefs["low_memory_spacy"],
+        )
     lemmas_conn = None
+    lemma_index = None
+    lemma_matcher = None
     if data.create_ww:
         lemmas_db_path = (
             wiktionary_db_path(data.plugin_path, data.book_lang, prefs)
@@ -280,15 +375,18 @@ def create_files(data: ParseJobData, prefs: Prefs, notif: Any) -> None:
             else kindle_db_path(data.plugin_path, data.book_lang, prefs)
         )
         lemmas_conn = sqlite3.connect(lemmas_db_path)
-        lemma_matcher = create_spacy_matcher(
-            nlp,
-            data.spacy_model,
-            data.book_lang,
-            not is_epub,
-            lemmas_conn,
-            data.plugin_path,
-            prefs,
-        )
+        with job_stats.stage("setup"):
+            lemma_matcher = create_spacy_matcher(
+                nlp,
+                data.spacy_model,
+                data.book_lang,
+                not is_epub,
+                lemmas_conn,
+                data.plugin_path,
+                prefs,
+                spacy_cache,
+            )
+            lemma_index = open_lemma_index(lemmas_conn, lemmas_db_path)
 
     mediawiki_api = data.book_settings.get("mediawiki_api", "")
     if data.create_x:
@@ -301,6 +399,8 @@ def create_files(data: ParseJobData, prefs: Prefs, notif: Any) -> None:
                 data.useragent,
                 data.plugin_path,
                 prefs["zh_wiki_variant"],
+                prefs["mediawiki_requests"],
+                prefs["prefetch_mediawiki"],
             )
             wikidata = (
                 None
@@ -308,7 +408,12 @@ def create_files(data: ParseJobData, prefs: Prefs, notif: Any) -> None:
                 else Wikidata(data.plugin_path, data.useragent)
             )
         custom_x_ray = load_custom_x_desc(data.book_path)
+        normalize_entity = lru_cache(maxsize=ENTITY_CACHE_SIZE)(process_entity)
 
+    needs_pipeline = (
+        paragraph_filter(nlp, lemma_matcher, data) if prefs["two_pass_nlp"] else None
+    )
+    content_filter = ContentFilter() if prefs["filter_content"] else None
     if is_epub:
         if data.create_x:
             wiki_commons = None
@@ -321,6 +426,7 @@ def create_files(data: ParseJobData, prefs: Prefs, notif: Any) -> None:
                 wikidata,
                 custom_x_ray,
                 lemmas_conn,
+                lemma_index,
                 prefs,
                 data.book_lang,
             )
@@ -332,187 +438,651 @@ def create_files(data: ParseJobData, prefs: Prefs, notif: Any) -> None:
                 None,
                 None,
                 lemmas_conn,
+                lemma_index,
                 prefs,
                 data.book_lang,
             )
 
-        for doc, (start, end, xhtml_path) in nlp.pipe(
-            epub.extract_epub(), as_tuples=True
+        for doc, (start, end, xhtml_path) in job_stats.wrap(
+            "nlp",
+            parse_paragraphs(
+                nlp,
+                job_stats.wrap("extraction", epub.extract_epub(content_filter)),
+                data,
+                prefs,
+                needs_pipeline,
+                job_stats,
+            ),
         ):
+            word_count += count_words(doc)
             intervals = []
             if data.create_x:
-                intervals = find_named_entity(
-                    start,
-                    epub,
-                    doc,
-                    "",
-                    data.book_lang,
-                    None,
-                    custom_x_ray,
-                    prefs,
-                    xhtml_path,
-                    end,
-                )
+                with job_stats.stage("entities"):
+                    intervals = find_named_entity(
+                        start,
+                        epub,
+                        doc,
+                        None,
+                        data.book_lang,
+                        None,
+                        custom_x_ray,
+                        prefs,
+                        xhtml_path,
+                        end,
+                        normalize_entity,
+                    )
             if data.create_ww:
-                interval_tree = None
-                if len(intervals) > 0:
-                    random.shuffle(intervals)
-                    interval_tree = IntervalTree()
-                    interval_tree.insert_intervals(intervals)
-                epub_find_lemma(
-                    doc,
-                    lemma_matcher,
-                    start,
-                    end,
-                    interval_tree,
-                    epub,
-                    xhtml_path,
-                )
+                with job_stats.stage("lemmas"):
+                    interval_tree = None
+                    if len(intervals) > 0:
+                        random.shuffle(intervals)
+                        interval_tree = IntervalTree()
+                        interval_tree.insert_intervals(intervals)
+                    epub_find_lemma(
+                        doc,
+                        lemma_matcher,
+                        start,
+                        end,
+                        interval_tree,
+                        epub,
+                        xhtml_path,
+                    )
         epub.modify_epub(
             get_custom_x_path(data.book_path)
             if data.create_x and prefs["preview_x_ray"] and not data.after_preview_x_ray
-            else None
+            else None,
+            job_stats,
         )
-        return
+        job_stats.count("entities", len(epub.entities))
+        job_stats.count("glosses", len(epub.sense_id_dict))
+        if content_filter is not None:
+            content_filter.save_stats(job_stats)
+        if data.create_x:
+            job_stats.count_cache("entity_cache", normalize_entity)
+        save_job_stats(job_stats, data, prefs, word_count)
+        return word_count
 
     # Kindle
     final_start = calculate_final_start(data)
     if data.create_ww:
-        ll_conn, ll_path = create_lang_layer(
+        ll_writer = create_lang_layer(
             data.asin,
             data.book_path,
             data.acr,
             data.revision,
         )
+        # spaCy docs and their Kindle positions waiting for the sense lookup
+        lemma_docs: list[tuple[Any, int, ByteOffsets | None, str | None]] = []
+        kindle_senses: dict[tuple[str, str, str | None], tuple[int, int] | None] = {}
 
-    if data.create_x:
-        x_ray_conn, x_ray_path = create_x_ray_db(
-            data.asin,
-            data.book_path,
-            data.book_lang,
-            data.plugin_path,
-            prefs,
-            mediawiki.sitename if mediawiki is not None else "",
-            mediawiki_api,
-        )
-        x_ray = X_Ray(x_ray_conn, mediawiki, wikidata, custom_x_ray)
-
-    for doc, context in nlp.pipe(parse_book(data), as_tuples=True):
-        if data.kfx_json is not None:
-            start = context
-            escaped_text = None
-        else:
-            start, escaped_text = context
+    try:
         if data.create_x:
-            find_named_entity(
-                start,
-                x_ray,
-                doc,
-                data.mobi_codec,
+            x_ray_conn, x_ray_path = create_x_ray_db(
+                data.asin,
+                data.book_path,
                 data.book_lang,
-                escaped_text,
+                data.plugin_path,
+                prefs,
+                mediawiki.sitename if mediawiki is not None else "",
+                mediawiki_api,
+            )
+            x_ray = X_Ray(
+                x_ray_conn,
+                mediawiki,
+                wikidata,
                 custom_x_ray,
+                prefs["deferred_entity_clustering"],
+            )
+
+        for doc, context in job_stats.wrap(
+            "nlp",
+            parse_paragraphs(
+                nlp,
+                job_stats.wrap("extraction", parse_book(data, content_filter)),
+                data,
                 prefs,
+                needs_pipeline,
+                job_stats,
+            ),
+        ):
+            word_count += count_words(doc)
+            if data.kfx_json is not None:
+                start = context
+                escaped_text = None
+            else:
+                start, escaped_text = context
+            byte_offsets = (
+                None
+                if escaped_text is None
+                else ByteOffsets(escaped_text, data.mobi_codec)
             )
-        if data.create_ww:
-            kindle_find_lemma(
-                doc,
-                lemma_matcher,
-                start,
+            if data.create_x:
+                with job_stats.stage("entities"):
+                    find_named_entity(
+                        start,
+                        x_ray,
+                        doc,
+                        byte_offsets,
+                        data.book_lang,
+                        escaped_text,
+                        custom_x_ray,
+                        prefs,
+                        normalize_entity=normalize_entity,
+                    )
+            if data.create_ww:
+                lemma_docs.append((doc, start, byte_offsets, escaped_text))
+                if len(lemma_docs) >= nlp.batch_size:
+                    with job_stats.stage("lemmas", len(lemma_docs)):
+                        kindle_find_lemma(
+                            lemma_docs,
+                            lemma_matcher,
+                            lemma_index,
+                            ll_writer,
+                            kindle_senses,
+                            data.book_lang,
+                            prefs,
+                        )
+                    lemma_docs.clear()
+            if notif:
+                notif.put((start / final_start, "Creating files"))
+
+        if data.create_ww and len(lemma_docs) > 0:
+            with job_stats.stage("lemmas", len(lemma_docs)):
+                kindle_find_lemma(
+                    lemma_docs,
+                    lemma_matcher,
+                    lemma_index,
+                    ll_writer,
+                    kindle_senses,
+                    data.book_lang,
+                    prefs,
+                )
+
+        if data.create_x:
+            x_ray.finish(
+                x_ray_path,
+                final_start,
+                data.kfx_json,
+                data.mobi_html,
                 data.mobi_codec,
-                escaped_text,
-                lemmas_conn,
-                ll_conn,
-                data.book_lang,
                 prefs,
+                job_stats,
+            )
+            job_stats.count("entities", len(x_ray.entities))
+            if prefs["preview_x_ray"] and not data.after_preview_x_ray:
+                with job_stats.stage("write"):
+                    x_ray.create_preview_json(
+                        get_custom_x_path(data.book_path), x_ray_path
+                    )
+        if data.create_ww:
+            with job_stats.stage("write"):
+                job_stats.count("glosses", ll_writer.count)
+                ll_writer.close()
+    except BaseException:
+        if data.create_ww:
+            # don't leave the temporary file in the book folder
+            ll_writer.abort()
+        raise
+    if data.create_ww:
+        lemmas_conn.close()  # type: ignore
+        lemma_index.close()  # type: ignore
+    if content_filter is not None:
+        content_filter.save_stats(job_stats)
+    if data.create_x:
+        job_stats.count_cache("entity_cache", normalize_entity)
+    save_job_stats(job_stats, data, prefs, word_count)
+    return word_count
+
+
+def save_job_stats(
+    job_stats: JobStats, data: ParseJobData, prefs: Prefs, word_count: int
+) -> None:
+    if prefs["save_job_stats"]:
+        job_stats.count("words", word_count)
+        job_stats.save(get_job_stats_path(data.book_path, data.book_fmt))
+
+
+def count_words(doc: Any) -> int:
+    return sum(not (token.is_punct or token.is_space) for token in doc)
+
+
+def pipe_paragraphs(
+    nlp: Any,
+    paragraphs: Iterator[tuple[str, Any]],
+    prefs: Prefs,
+    needs_pipeline: Callable[[Any], bool] | None = None,
+    job_stats: JobStats | None = None,
+) -> Iterator[tuple[Any, Any]]:
+    if needs_pipeline is None:
+        return pipe_texts(nlp, paragraphs, prefs, job_stats)
+    return two_pass_pipe(nlp, paragraphs, prefs, needs_pipeline, job_stats)
+
+
+def pipe_texts(
+    nlp: Any,
+    paragraphs: Iterator[tuple[str, Any]],
+    prefs: Prefs,
+    job_stats: JobStats | None,
+) -> Iterator[tuple[Any, Any]]:
+    # spaCy sends batches to the worker processes and yields the docs back
+    # in the input order, so the output files don't depend on the process count
+    if prefs["coalesce_paragraphs"]:
+        return coalesce_pipe(nlp, paragraphs, prefs, job_stats)
+    return nlp.pipe(paragraphs, as_tuples=True, n_process=prefs["nlp_processes"])
+
+
+# text nodes shorter than this are joined with their neighbours
+COALESCE_NODE_CHARS = 200
+COALESCE_DOC_CHARS = 2000
+COALESCE_SEPARATOR = "\n\n"
+# characters of the docs in one nlp.pipe batch
+PIPE_BATCH_CHARS = 100_000
+
+
+def coalesce_paragraphs(
+    paragraphs: Iterator[tuple[str, Any]],
+) -> Iterator[tuple[str, list[tuple[int, str, Any]]]]:
+    """
+    Join adjacent short text nodes, yield the joined text and the start offset,
+    text and context of each node.
+    """
+    nodes: list[tuple[int, str, Any]] = []
+    length = 0
+    for text, context in paragraphs:
+        # whitespace at the edges would be a part of the separator token
+        can_join = len(text) < COALESCE_NODE_CHARS and text == text.strip() != ""
+        if len(nodes) > 0 and (
+            not can_join
+            or length + len(COALESCE_SEPARATOR) + len(text) > COALESCE_DOC_CHARS
+        ):
+            yield COALESCE_SEPARATOR.join(x[1] for x in nodes), nodes
+            nodes = []
+            length = 0
+        if not can_join:
+            yield text, [(0, text, context)]
+            continue
+        if len(nodes) > 0:
+            length += len(COALESCE_SEPARATOR)
+        nodes.append((length, text, context))
+        length += len(text)
+    if len(nodes) > 0:
+        yield COALESCE_SEPARATOR.join(x[1] for x in nodes), nodes
+
+
+def coalesce_pipe(
+    nlp: Any,
+    paragraphs: Iterator[tuple[str, Any]],
+    prefs: Prefs,
+    job_stats: JobStats | None,
+) -> Iterator[tuple[Any, Any]]:
+    """
+    Parse joined short paragraphs then split the doc back to the paragraphs,
+    paragraphs are parsed again alone if the doc can't be split at the
+    paragraph boundaries.
+    """
+    from itertools import chain, islice
+
+    texts = coalesce_paragraphs(paragraphs)
+    # pick the batch size from the length of the first docs
+    first_texts = list(islice(texts, 256))
+    mean_chars = sum(len(text) for text, _ in first_texts) / max(len(first_texts), 1)
+    batch_size = max(1, min(nlp.batch_size, int(PIPE_BATCH_CHARS / max(mean_chars, 1))))
+    counts = {"coalesced_paragraphs": 0, "coalesced_docs": 0, "coalesce_fallbacks": 0}
+    for doc, nodes in nlp.pipe(
+        chain(first_texts, texts),
+        as_tuples=True,
+        batch_size=batch_size,
+        n_process=prefs["nlp_processes"],
+    ):
+        if len(nodes) == 1:
+            yield doc, nodes[0][2]
+            continue
+        counts["coalesced_paragraphs"] += len(nodes)
+        counts["coalesced_docs"] += 1
+        split_docs = split_coalesced_doc(doc, nodes)
+        if split_docs is None:
+            counts["coalesce_fallbacks"] += 1
+            split_docs = list(
+                nlp.pipe(
+                    ((text, context) for _, text, context in nodes), as_tuples=True
+                )
             )
-        if notif:
-            notif.put((start / final_start, "Creating files"))
+        yield from split_docs
+    if job_stats is not None:
+        for name, value in counts.items():
+            job_stats.count(name, value)
+
+
+def split_coalesced_doc(
+    doc: Any, nodes: list[tuple[int, str, Any]]
+) -> list[tuple[Any, Any]] | None:
+    """
+    Split the doc at the paragraph boundaries, return None if a paragraph isn't
+    aligned to the tokens or an entity crosses paragraphs. The tags, lemmas and
+    entities come from the joined text, they could be different from parsing
+    the paragraph alone.
+    """
+    results = []
+    for start, text, context in nodes:
+        span = doc.char_span(start, start + len(text))
+        if span is None or any(
+            ent.start < span.start < ent.end or ent.start < span.end < ent.end
+            for ent in doc.ents
+        ):
+            return None
+        results.append((span.as_doc(), context))
+    return results
 
+
+def two_pass_pipe(
+    nlp: Any,
+    paragraphs: Iterator[tuple[str, Any]],
+    prefs: Prefs,
+    needs_pipeline: Callable[[Any], bool],
+    job_stats: JobStats | None,
+) -> Iterator[tuple[Any, Any]]:
+    """
+    Tokenize the paragraphs first, only paragraphs could have Word Wise words
+    go through the pipeline components. Tokenized docs of the
+    other paragraphs are yielded in the input order.
+    """
+    # tokenized paragraphs waiting for the pipeline's docs, None is the
+    # placeholder of the paragraph sent to the pipeline
+    pending: deque[tuple[Any, Any] | None] = deque()
+    counts = {"pipeline": 0, "skipped": 0, "pipeline_tokens": 0, "skipped_tokens": 0}
+
+    def candidate_paragraphs() -> Iterator[tuple[str, Any]]:
+        for text, context in paragraphs:
+            doc = nlp.make_doc(text)
+            if needs_pipeline(doc):
+                counts["pipeline"] += 1
+                counts["pipeline_tokens"] += len(doc)
+                pending.append(None)
+                yield text, context
+            else:
+                counts["skipped"] += 1
+                counts["skipped_tokens"] += len(doc)
+                # the paragraph is one sentence, `Span.sent` needs sentence starts
+                for token in doc:
+                    token.is_sent_start = token.i == 0
+                pending.append((doc, context))
+
+    for doc, context in pipe_texts(nlp, candidate_paragraphs(), prefs, job_stats):
+        while (skipped := pending.popleft()) is not None:
+            yield skipped
+        yield doc, context
+    while len(pending) > 0:
+        yield pending.popleft()  # type: ignore
+
+    if job_stats is not None:
+        job_stats.count("pipeline_paragraphs", counts["pipeline"])
+        job_stats.count("skipped_paragraphs", counts["skipped"])
+        job_stats.count("skipped_tokens", counts["skipped_tokens"])
+        if counts["pipeline_tokens"] > 0 and "nlp" in job_stats.stages:
+            # assume the pipeline time is proportional to the token count
+            job_stats.charge_current_stage()
+            job_stats.count(
+                "estimated_saved_ms",
+                round(
+                    job_stats.stages["nlp"].wall
+                    * 1000
+                    * counts["skipped_tokens"]
+                    / counts["pipeline_tokens"]
+                ),
+            )
+
+
+def paragraph_filter(
+    nlp: Any, lemma_matcher: Any, data: ParseJobData
+) -> Callable[[Any], bool] | None:
+    """
+    Find tokenized paragraphs have Word Wise words. X-Ray entities could be in
+    almost every paragraph, X-Ray jobs don't skip paragraphs.
+    """
     if data.create_x:
-        x_ray.finish(
-            x_ray_path,
-            final_start,
-            data.kfx_json,
-            data.mobi_html,
-            data.mobi_codec,
-            prefs,
+        return None
+
+    def needs_pipeline(doc: Any) -> bool:
+        return len(find_lemma_spans(doc, lemma_matcher)) > 0
+
+    return needs_pipeline
+
+
+# DocBin attributes used by the X-Ray and Word Wise code
+PREVIEW_DOCS_ATTRS = [
+    "ORTH",
+    "TAG",
+    "POS",
+    "MORPH",
+    "LEMMA",
+    "ENT_IOB",
+    "ENT_TYPE",
+    "ENT_KB_ID",
+    "ENT_ID",
+    "SENT_START",
+]
+
+
+def parse_paragraphs(
+    nlp: Any,
+    paragraphs: Iterator[tuple[str, Any]],
+    data: ParseJobData,
+    prefs: Prefs,
+    needs_pipeline: Callable[[Any], bool] | None = None,
+    job_stats: JobStats | None = None,
+) -> Iterator[tuple[Any, Any]]:
+    """
+    Preview X-Ray jobs save the spaCy docs, the job runs after editing the X-Ray
+    entities only applies the entity ruler to the saved docs.
+    """
+    if not (data.create_x and prefs["preview_x_ray"]):
+        yield from pipe_paragraphs(nlp, paragraphs, prefs, needs_pipeline, job_stats)
+        return
+
+    from spacy.tokens import DocBin
+
+    paragraph_list = list(paragraphs)
+    docs_path = preview_docs_path(nlp, paragraph_list, data)
+    if data.after_preview_x_ray:
+        if docs_path.exists():
+            ruler = (
+                nlp.get_pipe("entity_ruler")
+                if "entity_ruler" in nlp.pipe_names
+                else None
+            )
+            for doc in DocBin().from_disk(docs_path).get_docs(nlp.vocab):
+                # only customized entities are used after preview
+                doc.ents = ()
+                if ruler is not None:
+                    doc = ruler(doc)
+                context = doc.user_data.pop("context")
+                if data.book_fmt == "EPUB":
+                    context = (context[0], context[1], Path(context[2]))
+                elif isinstance(context, list):
+                    context = tuple(context)
+                yield doc, context
+            docs_path.unlink()
+        else:
+            yield from pipe_paragraphs(
+                nlp, iter(paragraph_list), prefs, needs_pipeline, job_stats
+            )
+        return
+
+    delete_preview_docs(data.book_path)
+    doc_bin = DocBin(attrs=PREVIEW_DOCS_ATTRS, store_user_data=True)
+    for doc, context in pipe_paragraphs(
+        nlp, iter(paragraph_list), prefs, needs_pipeline, job_stats
+    ):
+        doc.user_data["context"] = (
+            [context[0], context[1], str(context[2])]
+            if data.book_fmt == "EPUB"
+            else context
         )
-        if prefs["preview_x_ray"] and not data.after_preview_x_ray:
-            x_ray.create_preview_json(get_custom_x_path(data.book_path), x_ray_path)
-    if data.create_ww:
-        save_db(ll_conn, ll_path)
-        lemmas_conn.close()  # type: ignore
+        doc_bin.add(doc)
+        del doc.user_data["context"]
+        yield doc, context
+    doc_bin.to_disk(docs_path)
+
+
+def preview_docs_path(
+    nlp: Any, paragraphs: list[tuple[str, Any]], data: ParseJobData
+) -> Path:
+    import spacy
+
+    book_hash = hashlib.sha1(
+        f"{spacy.__version__} {nlp.meta['lang']}_{nlp.meta['name']} "
+        f"{nlp.meta['version']} {data.book_fmt}".encode()
+    )
+    for text, context in paragraphs:
+        book_hash.update(f"{context}\0{text}\0".encode("utf-8", "surrogatepass"))
+    return Path(data.book_path).with_name(
+        f"worddumb-spacy-docs-{book_hash.hexdigest()}.spacy"
+    )
+
+
+def delete_preview_docs(book_path: str) -> None:
+    for path in Path(book_path).parent.glob("worddumb-spacy-docs-*.spacy"):
+        path.unlink()
 
 
-def parse_book(data: ParseJobData) -> Iterator[tuple[str, tuple[int, str] | int]]:
+def parse_book(
+    data: ParseJobData, content_filter: ContentFilter | None = None
+) -> Iterator[tuple[str, tuple[int, str] | int]]:
     if data.kfx_json is not None:
         for entry in filter(lambda x: x["type"] == 1, data.kfx_json):
             # Remove byte order mark and word joiner
-            yield re.sub(r"\ufeff|\u2060", " ", entry["content"]), entry["position"]
+            text = re.sub(r"\ufeff|\u2060", " ", entry["content"])
+            if content_filter is not None and content_filter.skip(TextNode(text)):
+                continue
+            yield text, entry["position"]
     elif data.mobi_html is not None:
+        toc_range = None if content_filter is None else mobi_toc_range(data.mobi_html)
         # match text inside HTML tags
         for match_body in re.finditer(b"<body.{3,}?</body>", data.mobi_html, re.DOTALL):
-            for m in re.finditer(b">[^<]{2,}<", match_body.group(0)):
+            body = match_body.group(0)
+            for m in re.finditer(b">[^<]{2,}<", body):
                 text = m.group(0)[1:-1].decode(data.mobi_codec)
                 text = re.sub(r"\ufeff|\u2060", " ", text)
-                yield unescape(text), (match_body.start() + m.start() + 1, text)
+                start = match_body.start() + m.start() + 1
+                paragraph = unescape(text)
+                if content_filter is not None and content_filter.skip(
+                    TextNode(
+                        paragraph,
+                        mobi_tag_before(body, m.start() + 1),
+                        toc_range is not None and toc_range[0] <= start < toc_range[1],
+                    )
+                ):
+                    continue
+                yield paragraph, (start, text)
 
 
 def index_in_escaped_text(
     token: str, escaped_text: str, start_offset: int
 ) -> tuple[int, int] | None:
-    if token not in escaped_text[start_offset:]:
-        # replace Unicode character to numeric character reference
-        token = escape(token, False).encode("ascii", "xmlcharrefreplace").decode()
+    token_start = escaped_text.find(token, start_offset)
+    if token_start == -1:
+        escaped_token = escape_token(token)
+        if escaped_token == token:
+            return None
+        token = escaped_token
+        token_start = escaped_text.find(token, start_offset)
+        if token_start == -1:
+            return None
+    return token_start, token_start + len(token)
 
-    if token in escaped_text[start_offset:]:
-        token_start = escaped_text.index(token, start_offset)
-        return token_start, token_start + len(token)
-    else:
-        return None
 
+@lru_cache(maxsize=4096)
+def escape_token(token: str) -> str:
+    # replace Unicode character to numeric character reference
+    return escape(token, False).encode("ascii", "xmlcharrefreplace").decode()
 
-def kindle_find_lemma(
-    doc,
-    lemma_matcher,
-    start,
-    mobi_codec,
-    escaped_text,
-    lemmas_conn,
-    ll_conn,
-    lemma_lang,
-    prefs,
-):
-    from spacy.util import filter_spans
 
-    lemma_starts: set[int] = set()
-    for span in filter_spans(lemma_matcher(doc, as_spans=True)):
-        data = get_kindle_lemma_data(
-            getattr(span, "lemma_", ""),
-            span.text,
-            getattr(span.doc[span.start], "pos_", ""),
-            lemmas_conn,
-            lemma_lang,
-            prefs,
-            span.sent.text,
-            (
-                span.start_char - span.sent.start_char,
-                span.end_char - span.sent.start_char,
-            ),
-        )
-        if data is not None:
-            kindle_add_lemma(
-                span.start_char,
-                span.end_char,
-                start,
-                doc.text,
-                ll_conn,
-                mobi_codec,
-                escaped_text,
-                lemma_starts,
-                data,
+class ByteOffsets:
+    """
+    Convert character index of the MOBI book text to the byte index of the
+    encoded text, the offsets are computed once for each paragraph.
+    """
+
+    def __init__(self, text: str, codec: str) -> None:
+        self.text = text
+        self.codec = codec
+        self.offsets: Any = None
+
+    def __getitem__(self, char_index: int) -> int:
+        if self.offsets is None:
+            self.offsets = self.build_offsets()
+        return int(self.offsets[char_index])
+
+    def build_offsets(self) -> Any:
+        # MOBI text is encoded in UTF-8 or CP1252
+        if self.text.isascii():
+            return range(len(self.text) + 1)
+        if codecs.lookup(self.codec).name == "utf-8":
+            import numpy as np
+
+            code_points = np.frombuffer(self.text.encode("utf-32-le"), dtype=np.uint32)
+            offsets = np.zeros(len(code_points) + 1, dtype=np.int64)
+            np.cumsum(
+                1
+                + (code_points >= 0x80)
+                + (code_points >= 0x800)
+                + (code_points >= 0x10000),
+                out=offsets[1:],
             )
+            return offsets
+        return [0] + list(
+            accumulate(len(char.encode(self.codec)) for char in self.text)
+        )
+
+
+def kindle_find_lemma(
+    lemma_docs: list[tuple[Any, int, ByteOffsets | None, str | None]],
+    lemma_matcher: Any,
+    lemma_index: LemmaIndex,
+    ll_writer: GlossWriter,
+    kindle_senses: dict[tuple[str, str, str | None], tuple[int, int] | None],
+    lemma_lang: str,
+    prefs: Prefs,
+) -> None:
+    is_kindle_db = use_kindle_ww_db(lemma_lang, prefs)
+    docs_spans = []
+    sense_keys = set()
+    for doc, *_ in lemma_docs:
+        spans = []
+        for start, end in find_lemma_spans(doc, lemma_matcher):
+            start_char, end_char, text, lemma = lemma_span_data(doc, start, end)
+            pos = getattr(doc[start], "pos_", "")
+            if pos != "":
+                sense_key = (
+                    lemma,
+                    text,
+                    spacy_to_kindle_pos(pos)
+                    if is_kindle_db
+                    else spacy_to_wiktionary_pos(pos),
+                )
+            else:
+                sense_key = (text, text, None)
+            spans.append((start_char, end_char, sense_key))
+            sense_keys.add(sense_key)
+        docs_spans.append(spans)
+
+    get_kindle_lemma_data(sense_keys, lemma_index, kindle_senses)
+    for (doc, start, byte_offsets, escaped_text), spans in zip(lemma_docs, docs_spans):
+        lemma_starts: set[int] = set()
+        for start_char, end_char, sense_key in spans:
+            data = kindle_senses[sense_key]
+            if data is not None:
+                kindle_add_lemma(
+                    start_char,
+                    end_char,
+                    start,
+                    doc.text,
+                    ll_writer,
+                    byte_offsets,
+                    escaped_text,
+                    lemma_starts,
+                    data,
+                )
 
 
 def epub_find_lemma(
@@ -524,27 +1094,53 @@ def epub_find_lemma(
     epub,
     xhtml_path,
 ):
-    from spacy.util import filter_spans
-
-    for span in filter_spans(lemma_matcher(doc, as_spans=True)):
+    for start, end in find_lemma_spans(doc, lemma_matcher):
+        start_char, end_char, text, lemma = lemma_span_data(doc, start, end)
         if interval_tree is not None and interval_tree.is_overlap(
-            Interval(span.start_char, span.end_char - 1)
+            Interval(start_char, end_char - 1)
         ):
             return
-        pos = getattr(span.doc[span.start], "pos_", "")
+        pos = getattr(doc[start], "pos_", "")
         epub.add_lemma(
-            getattr(span, "lemma_", ""),
-            span.text,
+            lemma,
+            text,
             spacy_to_wiktionary_pos(pos) if pos != "" else "",
             paragraph_start,
             paragraph_end,
-            span.start_char,
-            span.end_char,
+            start_char,
+            end_char,
             xhtml_path,
-            span.sent,
+            doc[start:end].sent,
         )
 
 
+def find_lemma_spans(doc, lemma_matcher) -> list[tuple[int, int]]:
+    """
+    Return start and end token indexes of the longest non-overlapping
+    Word Wise phrases.
+    """
+    if isinstance(lemma_matcher, TokenMatcher):
+        return lemma_matcher(doc)
+
+    from spacy.util import filter_spans
+
+    return [
+        (span.start, span.end)
+        for span in filter_spans(lemma_matcher(doc, as_spans=True))
+    ]
+
+
+def lemma_span_data(doc, start: int, end: int) -> tuple[int, int, str, str]:
+    # same values as Span.start_char, end_char, text and lemma_
+    start_char = doc[start].idx
+    last_token = doc[end - 1]
+    end_char = last_token.idx + len(last_token.text)
+    lemma = "".join(
+        getattr(token, "lemma_", "") + token.whitespace_ for token in doc[start:end]
+    ).strip()
+    return start_char, end_char, doc.text[start_char:end_char], lemma
+
+
 def spacy_to_kindle_pos(pos: str) -> str:
     # spaCy POS: https://universaldependencies.org/u/pos
     match pos:
@@ -567,79 +1163,24 @@ def spacy_to_kindle_pos(pos: str) -> str:
 
 
 def get_kindle_lemma_data(
-    lemma: str,
-    word: str,
-    pos: str,
-    conn: sqlite3.Connection,
-    lemma_lang: str,
-    prefs: Prefs,
-    sent: str,
-    offsets: tuple[int, int],
-) -> tuple[int, int] | None:
-    if pos != "":
-        return get_kindle_lemma_with_pos(
-            lemma,
-            word,
-            pos,
-            conn,
-            lemma_lang,
-            prefs,
-        )
-    else:
-        return get_kindle_lemma_without_pos(word, conn)
-
-
-def get_kindle_lemma_with_pos(
-    lemma: str,
-    word: str,
-    pos: str,
-    conn: sqlite3.Connection,
-    lemma_lang: str,
-    prefs: Prefs,
-) -> tuple[int, int] | None:
-    if use_kindle_ww_db(lemma_lang, prefs):
-        pos = spacy_to_kindle_pos(pos)
-    else:
-        pos = spacy_to_wiktionary_pos(pos)
-    sql = """
-    SELECT difficulty, id
-    FROM senses
-    WHERE lemma = ? AND pos = ? AND enabled = 1 LIMIT 1
-    """
-    for data in conn.execute(sql, (lemma, pos)):
-        return data
-
-    sql = """
-    SELECT difficulty, s.id
-    FROM senses s JOIN forms f ON s.form_group_id = f.form_group_id
-    WHERE form = ? AND pos = ? AND enabled = 1 LIMIT 1
-    """
-    for data in conn.execute(sql, (word, pos)):
-        return data
-
-    return None
-
-
-def get_kindle_lemma_without_pos(
-    word: str, conn: sqlite3.Connection
-) -> tuple[int, int] | None:
-    sql = """
-    SELECT difficulty, id
-    FROM senses
-    WHERE lemma = ? AND enabled = 1 LIMIT 1
+    sense_keys: set[tuple[str, str, str | None]],
+    lemma_index: LemmaIndex,
+    kindle_senses: dict[tuple[str, str, str | None], tuple[int, int] | None],
+) -> None:
     """
-    for data in conn.execute(sql, (word,)):
-        return data
-
-    sql = """
-    SELECT difficulty, s.id
-    FROM senses s JOIN forms f ON s.form_group_id = f.form_group_id
-    WHERE form = ? AND enabled = 1 LIMIT 1
+    Find the difficulty and sense id of the (lemma, form, POS) keys and save them
+    in `kindle_senses`. The lemma is searched first then the inflected form,
+    keys without POS use the form as lemma.
     """
-    for data in conn.execute(sql, (word,)):
-        return data
-
-    return None
+    for key in sense_keys:
+        if key in kindle_senses:
+            continue
+        lemma, form, pos = key
+        if pos is not None:
+            senses = lemma_index.get("l", lemma, pos) or lemma_index.get("f", form, pos)
+        else:
+            senses = lemma_index.get("L", lemma) or lemma_index.get("F", form)
+        kindle_senses[key] = senses[0] if len(senses) > 0 else None
 
 
 def kindle_add_lemma(
@@ -647,20 +1188,21 @@ def kindle_add_lemma(
     token_end: int,
     text_start: int,
     text: str,
-    ll_conn: Connection,
-    mobi_codec: str,
-    escaped_text: str,
+    ll_writer: GlossWriter,
+    byte_offsets: ByteOffsets | None,
+    escaped_text: str | None,
     starts: set[int],
     data: tuple[int, int],
 ):
     end = None
     lemma = text[token_start:token_end]
-    if mobi_codec:
+    # MOBI books have both, KFX books have neither
+    if byte_offsets is not None and escaped_text is not None:
         result = index_in_escaped_text(lemma, escaped_text, token_start)
         if result is None:
             return
         lemma_start, lemma_end = result
-        index = text_start + len(escaped_text[:lemma_start].encode(mobi_codec))
+        index = text_start + byte_offsets[lemma_start]
     else:
         index = text_start + token_start
 
@@ -670,11 +1212,11 @@ def kindle_add_lemma(
         starts.add(index)
 
     if " " in lemma:
-        if mobi_codec:
-            end = index + len(escaped_text[lemma_start:lemma_end].encode(mobi_codec))
+        if byte_offsets is not None and escaped_text is not None:
+            end = text_start + byte_offsets[lemma_end]
         else:
             end = index + len(lemma)
-    insert_lemma(ll_conn, (index, end) + data)
+    ll_writer.add(index, end, *data)
 
 
 DIRECTIONS = frozenset(
@@ -691,30 +1233,40 @@ DIRECTIONS = frozenset(
 )
 
 
+URL_RE = re.compile(r"https?:|www\.", re.IGNORECASE)
+LEADING_NON_WORD_RE = re.compile(r"^\W+")
+TRAILING_NON_WORD_RE = re.compile(r"\W+$")
+# chapter title(chapter 1) and page number reference(pp. 1-10)
+EN_IGNORED_RE = re.compile(r"c?hapter|p{1,2}[\W\d]{2,}", re.IGNORECASE)
+EN_SUFFIX_RE = re.compile(r"\W+[sd]$|\s+of$")
+EN_ARTICLE_RE = re.compile(r"^(?:the|an?)\s", re.IGNORECASE)
+# https://en.wikipedia.org/wiki/Spanish_determiners#Articles
+ES_ARTICLE_RE = re.compile(r"^(?:el|los?|las?|un|unos?|unas?)\s", re.IGNORECASE)
+NON_NAME_RE = re.compile(r"[\W\d]+")
+# distinct entity texts memoized in each job
+ENTITY_CACHE_SIZE = 8192
+
+
 def process_entity(text: str, lang: str, len_limit: int) -> str | None:
-    if re.search(r"https?:|www\.", text, re.IGNORECASE):
+    if URL_RE.search(text):
         return None
-    text = re.sub(r"^\W+", "", text)
-    text = re.sub(r"\W+$", "", text)
+    text = LEADING_NON_WORD_RE.sub("", text)
+    text = TRAILING_NON_WORD_RE.sub("", text)
 
     if lang == "en":
-        # ignore chapter title(chapter 1) and page number reference(pp. 1-10)
-        if re.match(r"c?hapter|p{1,2}[\W\d]{2,}", text, re.IGNORECASE):
+        if EN_IGNORED_RE.match(text):
             return None
-        text = re.sub(r"\W+[sd]$|\s+of$", "", text)
-        text = re.sub(r"^(?:the|an?)\s", "", text, flags=re.IGNORECASE)
-        text = re.sub(r"^\W+", "", text)
+        text = EN_SUFFIX_RE.sub("", text)
+        text = EN_ARTICLE_RE.sub("", text)
+        text = LEADING_NON_WORD_RE.sub("", text)
         if text.lower() in DIRECTIONS:
             return None
     elif lang == "es":
-        # https://en.wikipedia.org/wiki/Spanish_determiners#Articles
-        text = re.sub(
-            r"^(?:el|los?|las?|un|unos?|unas?)\s", "", text, flags=re.IGNORECASE
-        )
-        text = re.sub(r"^\W+", "", text)
+        text = ES_ARTICLE_RE.sub("", text)
+        text = LEADING_NON_WORD_RE.sub("", text)
     # TODO https://en.wikipedia.org/wiki/Article_(grammar)#Tables
 
-    if len(text) < len_limit or re.fullmatch(r"[\W\d]+", text):
+    if len(text) < len_limit or NON_NAME_RE.fullmatch(text):
         return None
 
     return text
@@ -724,13 +1276,14 @@ def find_named_entity(
     start: int,
     x_ray: X_Ray | EPUB,
     doc: Any,
-    mobi_codec: str,
+    byte_offsets: ByteOffsets | None,
     lang: str,
     escaped_text: str | None,
     custom_x_ray: CustomXDict,
     prefs: Prefs,
     xhtml_path: Path | None = None,
     end: int = 0,
+    normalize_entity: Callable[[str, str, int], str | None] = process_entity,
 ) -> list[Interval]:
     len_limit = 2 if lang in CJK_LANGS else 3
     starts = set()
@@ -739,7 +1292,7 @@ def find_named_entity(
         text = (
             ent.ent_id_  # customized X-Ray
             if ent.ent_id_
-            else process_entity(ent.text, lang, len_limit)
+            else normalize_entity(ent.text, lang, len_limit)
         )
         if (
             text is None
@@ -786,9 +1339,12 @@ def find_named_entity(
         # Include the next punctuation so the word can be selected on Kindle
         if re.match(r"[^\w\s]", book_text[end_char : end_char + 1]):
             selectable_text = book_text[start_char : end_char + 1]
-        if mobi_codec is not None and escaped_text is not None:
-            ent_start = start + len(escaped_text[:start_char].encode(mobi_codec))
-            ent_len = len(selectable_text.encode(mobi_codec))
+        if byte_offsets is not None:
+            ent_start = start + byte_offsets[start_char]
+            ent_len = (
+                byte_offsets[start_char + len(selectable_text)]
+                - byte_offsets[start_char]
+            )
         else:
             ent_start = start + start_char
             ent_len = len(selectable_text)
@@ -798,19 +1354,39 @@ def find_named_entity(
     return intervals
 
 
-def load_spacy(model: str, book_path: str | None, lemma_lang: str) -> Any:
+def load_spacy(
+    model: str,
+    book_path: str | None,
+    lemma_lang: str,
+    spacy_cache: SpacyCache | None = None,
+    low_memory: bool = False,
+) -> Any:
     import spacy
 
     if model == "":
         return spacy.blank(lemma_lang)
 
-    excluded_components = ["parser"]
-    if book_path is None:
-        excluded_components.append("ner")
-
-    nlp = spacy.load(model, exclude=excluded_components)
-    # simpler and faster https://spacy.io/usage/linguistic-features#sbd
-    nlp.enable_pipe("senter")
+    cache_key = (model, book_path is not None, low_memory)
+    if spacy_cache is not None and cache_key in spacy_cache.pipelines:
+        nlp = spacy_cache.pipelines[cache_key]
+        # remove last book's customized X-Ray entities
+        if "entity_ruler" in nlp.pipe_names:
+            nlp.remove_pipe("entity_ruler")
+    else:
+        excluded_components = ["parser"]
+        if book_path is None:
+            excluded_components.append("ner")
+        if low_memory:
+            # "vectors" is passed to Vocab.from_disk()
+            excluded_components.append("vectors")
+
+        nlp = spacy.load(model, exclude=excluded_components)
+        # simpler and faster https://spacy.io/usage/linguistic-features#sbd
+        nlp.enable_pipe("senter")
+        if low_memory and uses_static_vectors(nlp):
+            load_static_vectors(nlp)
+        if spacy_cache is not None:
+            spacy_cache.pipelines[cache_key] = nlp
 
     if book_path is not None:
         custom_x_path = get_custom_x_path(book_path)
@@ -829,19 +1405,60 @@ def load_spacy(model: str, book_path: str | None, lemma_lang: str) -> Any:
     return nlp
 
 
+def uses_static_vectors(nlp: Any) -> bool:
+    """
+    Find enabled components use the static vectors in their tok2vec layer.
+    """
+
+    def find_static_vectors(config: Any) -> bool:
+        if isinstance(config, dict):
+            if config.get("include_static_vectors") is True or "StaticVectors" in str(
+                config.get("@architectures", "")
+            ):
+                return True
+            return any(find_static_vectors(value) for value in config.values())
+        if isinstance(config, list):
+            return any(find_static_vectors(value) for value in config)
+        return False
+
+    return any(
+        find_static_vectors(nlp.config["components"].get(name, {}))
+        for name in nlp.pipe_names
+    )
+
+
+def load_static_vectors(nlp: Any) -> None:
+    """
+    Memory-map the vectors table, workers load the same model share the pages.
+    """
+    import numpy as np
+
+    vocab_path = Path(nlp.path) / "vocab"
+    vectors = nlp.vocab.vectors
+    # load settings and keys
+    vectors.from_disk(vocab_path, exclude=["strings", "vectors"])
+    if vectors.mode != "default" or not (vocab_path / "vectors").exists():
+        vectors.from_disk(vocab_path, exclude=["strings"])
+        return
+    # copy-on-write, thinc's Cython code doesn't accept read-only arrays
+    vectors.data = np.load(vocab_path / "vectors", mmap_mode="c")
+    vectors._sync_unset()
+
+
 def create_spacy_matcher(
-    nlp, model, lemma_lang, is_kindle, lemmas_conn, plugin_path, prefs
+    nlp, model, lemma_lang, is_kindle, lemmas_conn, plugin_path, prefs, spacy_cache=None
 ):
     from spacy.matcher import PhraseMatcher
     from spacy.tokens import DocBin
 
-    disabled_pipes = list(set(["ner", "parser", "senter"]) & set(nlp.pipe_names))
     pkg_versions = load_plugin_json(plugin_path, "data/deps.json")
     model_version = get_spacy_model_version(model, pkg_versions)
-    lemma_matcher = PhraseMatcher(nlp.vocab, attr="LOWER")
     lemmas_doc_path = spacy_doc_path(
         model, model_version, lemma_lang, is_kindle, plugin_path, prefs
     )
+    keywords_path = lemma_keywords_path(
+        lemmas_doc_path, lemmas_difficulty_limit(lemma_lang, is_kindle, prefs)
+    )
     if not lemmas_doc_path.exists():
         save_spacy_docs(
             nlp,
@@ -853,7 +1470,29 @@ def create_spacy_matcher(
             plugin_path,
             prefs,
         )
-    lemmas_doc_bin = DocBin().from_disk(lemmas_doc_path)
-    with nlp.select_pipes(disable=disabled_pipes):
-        lemma_matcher.add("lemmas", lemmas_doc_bin.get_docs(nlp.vocab))
-        return lemma_matcher
+    elif not keywords_path.exists():
+        # lemmas file created by older version
+        save_lemma_keywords(
+            [
+                [token.lower for token in doc]
+                for doc in DocBin().from_disk(lemmas_doc_path).get_docs(nlp.vocab)
+            ],
+            keywords_path,
+        )
+    # lemmas file is rewritten after customizing Word Wise
+    cache_key = (
+        id(nlp.vocab),
+        str(keywords_path),
+        keywords_path.stat().st_mtime_ns,
+        prefs["lemma_matcher"],
+    )
+    if spacy_cache is not None and cache_key in spacy_cache.matchers:
+        return spacy_cache.matchers[cache_key]
+    if prefs["lemma_matcher"] == "aho_corasick":
+        lemma_matcher = TokenMatcher(load_lemma_keywords(keywords_path))
+    else:
+        lemma_matcher = PhraseMatcher(nlp.vocab, attr="LOWER")
+        lemma_matcher.add("lemmas", load_lemma_keywords(keywords_path))
+    if spacy_cache is not None:
+        spacy_cache.matchers[cache_key] = lemma_matcher
+    return lemma_matcher
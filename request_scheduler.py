@@ -0,0 +1,144 @@
+"""
+Send HTTP requests with retries and adaptive concurrency, used by the
+MediaWiki, Wikidata and Wikimedia Commons clients.
+"""
+
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any
+
+try:
+    from .job_stats import JobStats
+except ImportError:
+    from job_stats import JobStats
+
+# https://www.mediawiki.org/wiki/Manual:Maxlag_parameter
+MAXLAG_SECONDS = 5
+RETRY_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+MAX_RETRIES = 5
+MAX_BACKOFF_SECONDS = 60
+# give up if the server asks to wait longer than this
+MAX_RETRY_AFTER_SECONDS = 60
+# increase the concurrency limit by one after this many successful requests
+INCREASE_AFTER_REQUESTS = 10
+
+
+class RequestScheduler:
+    """
+    Retry throttled and failed requests after the `Retry-After` time or an
+    exponential backoff, give up if `Retry-After` is longer than
+    `MAX_RETRY_AFTER_SECONDS`. All threads wait before retrying, and the number
+    of concurrent requests is halved after each retry then slowly increased
+    back to `max_requests`.
+    """
+
+    def __init__(
+        self, session: Any, max_requests: int = 1, max_retries: int = MAX_RETRIES
+    ) -> None:
+        self.session = session
+        self.max_requests = max_requests
+        self.max_retries = max_retries
+        self.limit = max_requests
+        self.in_flight = 0
+        self.successes = 0
+        # time.monotonic() value, don't send requests before this time
+        self.resume_time = 0.0
+        self.condition = threading.Condition()
+        self.retries = 0
+        self.wait_seconds = 0.0
+
+    def get(self, url: str, **kwargs: Any) -> Any:
+        import requests
+
+        attempt = 0
+        while True:
+            self.acquire()
+            try:
+                response = self.session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self.release(False)
+                if attempt >= self.max_retries:
+                    raise
+                retry_after = None
+            except BaseException:
+                self.release(False)
+                raise
+            else:
+                retry = should_retry(response)
+                self.release(not retry)
+                if not retry or attempt >= self.max_retries:
+                    return response
+                retry_after = parse_retry_after(response.headers.get("retry-after"))
+                if retry_after is not None and retry_after > MAX_RETRY_AFTER_SECONDS:
+                    return response
+                response.close()
+            attempt += 1
+            if retry_after is None:
+                retry_after = min(2**attempt, MAX_BACKOFF_SECONDS) * random.uniform(
+                    0.5, 1
+                )
+            with self.condition:
+                self.retries += 1
+                self.resume_time = max(self.resume_time, time.monotonic() + retry_after)
+
+    def acquire(self) -> None:
+        with self.condition:
+            start = time.monotonic()
+            while True:
+                now = time.monotonic()
+                if now < self.resume_time:
+                    self.condition.wait(self.resume_time - now)
+                elif self.in_flight >= self.limit:
+                    self.condition.wait()
+                else:
+                    break
+            self.wait_seconds += time.monotonic() - start
+            self.in_flight += 1
+
+    def release(self, success: bool) -> None:
+        with self.condition:
+            self.in_flight -= 1
+            if success:
+                self.successes += 1
+                if (
+                    self.successes >= INCREASE_AFTER_REQUESTS
+                    and self.limit < self.max_requests
+                ):
+                    self.limit += 1
+                    self.successes = 0
+            else:
+                self.limit = max(self.limit // 2, 1)
+                self.successes = 0
+            self.condition.notify_all()
+
+    def save_stats(self, job_stats: JobStats, name: str) -> None:
+        job_stats.count(f"{name}_retries", self.retries)
+        job_stats.count(f"{name}_wait_ms", round(self.wait_seconds * 1000))
+
+
+def should_retry(response: Any) -> bool:
+    return (
+        response.status_code in RETRY_STATUS_CODES
+        # MediaWiki returns status code 200 for maxlag error
+        or response.headers.get("mediawiki-api-error") == "maxlag"
+    )
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    The `Retry-After` header is either seconds or an HTTP date.
+    """
+    if value is None:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        retry_date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_date.tzinfo is None:
+        retry_date = retry_date.replace(tzinfo=timezone.utc)
+    return max((retry_date - datetime.now(timezone.utc)).total_seconds(), 0)
@@ -0,0 +1,508 @@
+"""
+Create files for synthetic books of different sizes and report throughput,
+peak memory and the time of each step.
+
+The MediaWiki API is answered locally, spaCy, lxml, rapidfuzz and requests
+should be installed in the Python environment or in the folder of `--libs`.
+
+python benchmark.py --sizes 10000 100000 1000000 --formats EPUB AZW3 KFX
+python benchmark.py --mode default --mode processes:nlp_processes=2
+
+Modes that create different files from the first mode are reported.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from html import escape
+from pathlib import Path
+
+REPO_PATH = Path(__file__).resolve().parent.parent
+BENCHMARK_API = "https://wiki.benchmark.invalid/w/api.php"
+SYLLABLES = ["ka", "lo", "mi", "ren", "sa", "tor", "vel", "qui", "dan", "bre", "ny"]
+COMMON_WORDS = (
+    "the a of and to in was he she it that with for as on at by his her they "
+    "from had were said would could house river road morning night window door "
+    "walked looked found wanted thought remembered quiet old small long dark "
+    "café naïve façade déjà résumé"
+).split()
+DEFAULT_PREFS = {
+    "zh_wiki_variant": "cn",
+    "minimal_x_ray_count": 1,
+    "gloss_lang": "en",
+    "use_wiktionary_for_kindle": False,
+    "python_path": "",
+    "custom_entity_only": False,
+    "preview_x_ray": False,
+    "nlp_processes": 1,
+    "save_job_stats": True,
+    "lemma_matcher": "phrase_matcher",
+    "low_memory_spacy": False,
+    "two_pass_nlp": False,
+    "coalesce_paragraphs": False,
+    "filter_content": False,
+    "deferred_entity_clustering": False,
+    "mediawiki_requests": 1,
+    "prefetch_mediawiki": False,
+    "en_wiktionary_difficulty_limit": 5,
+}
+
+
+def pseudo_word(rng: random.Random, syllables: int) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(syllables))
+
+
+class SyntheticBook:
+    def __init__(self, words: int, seed: int = 0) -> None:
+        rng = random.Random(seed)
+        vocabulary_size = 2000
+        self.vocabulary = COMMON_WORDS + [
+            pseudo_word(rng, rng.randint(2, 4)) for _ in range(vocabulary_size)
+        ]
+        # distinct names grow slower than the book like real books
+        names_count = max(20, int(30 * (words / 10000) ** 0.7))
+        self.names = [
+            f"{pseudo_word(rng, 2).title()} {pseudo_word(rng, 3).title()}"
+            for _ in range(names_count)
+        ]
+        self.places = [
+            pseudo_word(rng, 3).title() + " City" for _ in range(names_count // 3)
+        ]
+        self.paragraphs: list[str] = []
+        count = 0
+        while count < words:
+            sentences = []
+            for _ in range(rng.randint(2, 8)):
+                sentence = [
+                    rng.choice(self.vocabulary) for _ in range(rng.randint(6, 18))
+                ]
+                for _ in range(rng.randint(0, 2)):
+                    sentence.insert(
+                        rng.randint(0, len(sentence)),
+                        rng.choice(self.names)
+                        if rng.random() < 0.8
+                        else rng.choice(self.places),
+                    )
+                count += len(sentence)
+                sentences.append(" ".join(sentence).capitalize() + ".")
+            self.paragraphs.append(" ".join(sentences))
+
+    def save_epub(self, path: Path) -> None:
+        chapters = [
+            self.paragraphs[index : index + 100]
+            for index in range(0, len(self.paragraphs), 100)
+        ]
+        with zipfile.ZipFile(path, "w") as zf:
+            zf.writestr("mimetype", "application/epub+zip")
+            zf.writestr(
+                "META-INF/container.xml",
+                '<?xml version="1.0"?><container version="1.0" '
+                'xmlns="urn:oasis:names:tc:opendocument:xmlns:container"><rootfiles>'
+                '<rootfile full-path="OEBPS/content.opf" '
+                'media-type="application/oebps-package+xml"/></rootfiles></container>',
+            )
+            manifest = ""
+            spine = ""
+            for index, chapter in enumerate(chapters):
+                manifest += (
+                    f'<item id="c{index}" href="c{index}.xhtml" '
+                    'media-type="application/xhtml+xml"/>'
+                )
+                spine += f'<itemref idref="c{index}"/>'
+                body = "".join(f"<p>{escape(p)}</p>" for p in chapter)
+                zf.writestr(
+                    f"OEBPS/c{index}.xhtml",
+                    '<?xml version="1.0" encoding="utf-8"?>'
+                    '<html xmlns="http://www.w3.org/1999/xhtml"><head>'
+                    f"<title>{index}</title></head><body>{body}</body></html>",
+                )
+            zf.writestr(
+                "OEBPS/content.opf",
+                '<?xml version="1.0" encoding="utf-8"?>'
+                '<package xmlns="http://www.idpf.org/2007/opf" version="3.0" '
+                'unique-identifier="id"><metadata '
+                'xmlns:dc="http://purl.org/dc/elements/1.1/">'
+                '<dc:identifier id="id">benchmark</dc:identifier>'
+                "<dc:title>Benchmark</dc:title><dc:language>en</dc:language>"
+                f"</metadata><manifest>{manifest}</manifest>"
+                f"<spine>{spine}</spine></package>",
+            )
+
+    def mobi_html(self) -> bytes:
+        body = "".join(f"<p>{escape(p)}</p>" for p in self.paragraphs)
+        return f"<html><head></head><body>{body}</body></html>".encode("utf-8")
+
+    def kfx_json(self) -> list[dict]:
+        kfx_json = []
+        position = 0
+        for paragraph in self.paragraphs:
+            kfx_json.append({"type": 1, "content": paragraph, "position": position})
+            position += len(paragraph) + 1
+        return kfx_json
+
+
+def create_plugin_folder(folder: Path, vocabulary: list[str]) -> Path:
+    # only the data files are read from the plugin zip file
+    plugin_path = folder / "WordDumb.zip"
+    with zipfile.ZipFile(plugin_path, "w") as zf:
+        for path in (REPO_PATH / "data").iterdir():
+            zf.write(path, f"data/{path.name}")
+
+    sys.path.insert(0, str(REPO_PATH))
+    from utils import kindle_db_path, wiktionary_db_path
+
+    for db_path in (
+        kindle_db_path(plugin_path, "en", DEFAULT_PREFS),  # type: ignore
+        wiktionary_db_path(plugin_path, "en", DEFAULT_PREFS),  # type: ignore
+    ):
+        create_lemmas_db(db_path, vocabulary)
+    return plugin_path
+
+
+def create_lemmas_db(db_path: Path, vocabulary: list[str]) -> None:
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    db_path.unlink(missing_ok=True)
+    rng = random.Random(1)
+    conn = sqlite3.connect(db_path)
+    conn.executescript(
+        """
+        CREATE TABLE senses (
+        id INTEGER PRIMARY KEY, enabled INTEGER, lemma TEXT, pos TEXT,
+        short_def TEXT, full_def TEXT, example TEXT, difficulty INTEGER,
+        sound_id INTEGER, form_group_id INTEGER);
+        CREATE TABLE forms (form TEXT, form_group_id INTEGER);
+        CREATE TABLE sounds (
+        id INTEGER PRIMARY KEY, ipa TEXT, ga_ipa TEXT, rp_ipa TEXT,
+        pinyin TEXT, bopomofo TEXT);
+        CREATE INDEX idx_senses ON senses (lemma, pos);
+        CREATE INDEX idx_forms ON forms (form);
+        """
+    )
+    for form_group_id, word in enumerate(vocabulary[len(COMMON_WORDS) // 2 :]):
+        for pos in rng.sample(["noun", "verb", "adj", "adv"], rng.randint(1, 2)):
+            conn.execute(
+                """
+                INSERT INTO senses (enabled, lemma, pos, short_def, full_def,
+                example, difficulty, form_group_id)
+                VALUES(1, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    word,
+                    pos,
+                    f"short {word}",
+                    f"full definition of {word}",
+                    None,
+                    rng.randint(1, 5),
+                    form_group_id,
+                ),
+            )
+        conn.executemany(
+            "INSERT INTO forms VALUES(?, ?)",
+            ((word + suffix, form_group_id) for suffix in ["s", "ed"]),
+        )
+    conn.commit()
+    conn.close()
+
+
+def offline_send(self, request, **kwargs):
+    # replace the HTTP layer of requests, answer MediaWiki API requests
+    from urllib.parse import parse_qs, urlsplit
+
+    import requests
+
+    params = {k: v[0] for k, v in parse_qs(urlsplit(request.url).query).items()}
+    response = requests.Response()
+    response.request = request
+    response.url = request.url
+    response.status_code = 200
+    response.encoding = "utf-8"
+    time.sleep(OFFLINE_API_LATENCY)
+    data = {}
+    if params.get("meta") == "siteinfo":
+        data = {"query": {"general": {"sitename": "Benchmark Wiki"}}}
+    elif params.get("modules") == "query+extracts":
+        data = {"paraminfo": {"modules": [{"name": "extracts"}]}}
+    elif params.get("action") == "query" and "titles" in params:
+        data = {
+            "query": {
+                "pages": [
+                    {"title": title, "extract": f"{title} is a benchmark entry."}
+                    for title in params["titles"].split("|")
+                ]
+            }
+        }
+    else:
+        response.status_code = 404
+    response._content = json.dumps(data).encode("utf-8")
+    return response
+
+
+OFFLINE_API_LATENCY = 0.0
+
+
+def run_child(config: dict) -> None:
+    global OFFLINE_API_LATENCY
+
+    for path in config["libs"]:
+        sys.path.insert(0, path)
+    sys.path.insert(0, str(REPO_PATH))
+    import requests.adapters
+
+    from parse_job import ParseJobData, create_files
+
+    OFFLINE_API_LATENCY = config["latency"]
+    requests.adapters.HTTPAdapter.send = offline_send  # type: ignore
+
+    book = SyntheticBook(config["words"], config["seed"])
+    book_folder = Path(config["folder"])
+    book_fmt = config["book_fmt"]
+    data = ParseJobData(
+        book_path=str(book_folder / f"book.{book_fmt.lower()}"),
+        book_fmt=book_fmt,
+        book_lang="en",
+        create_ww=True,
+        create_x=True,
+        asin="BENCHMARK",
+        acr="BENCHMARK",
+        revision="0",
+        plugin_path=config["plugin_path"],
+        useragent="WordDumb benchmark",
+        spacy_model=config["model"],
+        book_settings={"mediawiki_api": BENCHMARK_API},
+    )
+    if book_fmt == "EPUB":
+        book.save_epub(Path(data.book_path))
+    elif book_fmt == "KFX":
+        data.kfx_json = book.kfx_json()
+    else:
+        data.mobi_html = book.mobi_html()
+        data.mobi_codec = "utf-8"
+
+    start = time.perf_counter()
+    words = create_files(data, config["prefs"], None)
+    wall = time.perf_counter() - start
+    with (book_folder / f"worddumb-job-stats-{book_fmt.lower()}.json").open() as f:
+        stats = json.load(f)
+    print(
+        json.dumps(
+            {
+                "words": words,
+                "wall_seconds": wall,
+                "peak_rss_mb": peak_rss_mb(),
+                "stages": stats["stages"],
+                "counters": stats["counters"],
+                "output_digest": output_digest(data),
+            }
+        )
+    )
+
+
+def output_digest(data) -> str:
+    from database import get_ll_path, get_x_ray_path
+
+    digest = hashlib.sha1()
+    if data.book_fmt == "EPUB":
+        with zipfile.ZipFile(data.book_path) as zf:
+            for name in sorted(zf.namelist()):
+                digest.update(name.encode("utf-8") + b"\0" + zf.read(name))
+        return digest.hexdigest()
+
+    for path in (
+        get_ll_path(data.asin, data.book_path),
+        get_x_ray_path(data.asin, data.book_path),
+    ):
+        conn = sqlite3.connect(path)
+        for (table,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name"
+        ):
+            for row in conn.execute(f"SELECT * FROM {table}"):
+                digest.update(repr(row).encode("utf-8"))
+        conn.close()
+    return digest.hexdigest()
+
+
+def peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def slope(points: list[tuple[float, float]]) -> float | None:
+    # least squares slope of log(time) and log(words), 1 is linear
+    points = [(math.log(x), math.log(y)) for x, y in points if x > 0 and y > 0]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    if variance == 0:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
+
+
+def parse_mode(mode: str) -> tuple[str, dict]:
+    name, _, options = mode.partition(":")
+    prefs = {}
+    for option in filter(None, options.split(",")):
+        key, value = option.split("=", 1)
+        try:
+            prefs[key] = json.loads(value)
+        except ValueError:
+            prefs[key] = value
+    return name, prefs
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument(
+        "--sizes", nargs="+", type=int, default=[10000, 50000, 200000, 1000000]
+    )
+    parser.add_argument("--formats", nargs="+", default=["EPUB", "AZW3", "KFX"])
+    parser.add_argument("--model", default="en_core_web_sm", help="spaCy model")
+    parser.add_argument("--libs", nargs="*", default=[], help="extra sys.path")
+    parser.add_argument(
+        "--mode",
+        action="append",
+        help="name:pref=value,pref=value, run each mode to compare preferences",
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds of each API request"
+    )
+    parser.add_argument(
+        "--threshold", type=float, default=1.15, help="flag slopes above this"
+    )
+    parser.add_argument("--output", help="save results to this JSON file")
+    args = parser.parse_args()
+    if args.child:
+        run_child(json.loads(args.child))
+        return
+
+    modes = [parse_mode(mode) for mode in args.mode or ["default"]]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        plugin_folder = Path(tmp_dir) / "plugins"
+        plugin_folder.mkdir()
+        plugin_path = create_plugin_folder(plugin_folder, SyntheticBook(0).vocabulary)
+        for mode_name, mode_prefs in modes:
+            for book_fmt in args.formats:
+                results.append({"mode": mode_name, "format": book_fmt, "runs": []})
+                # the first run creates the lemma files, don't measure it
+                for index, words in enumerate([args.sizes[0]] + args.sizes):
+                    shutil.rmtree(plugin_folder / "worddumb-mediawiki", True)
+                    book_folder = Path(tmp_dir) / "book"
+                    shutil.rmtree(book_folder, True)
+                    book_folder.mkdir()
+                    config = {
+                        "words": words,
+                        "seed": 0,
+                        "book_fmt": book_fmt,
+                        "folder": str(book_folder),
+                        "plugin_path": str(plugin_path),
+                        "model": args.model,
+                        "libs": args.libs,
+                        "latency": args.latency,
+                        "prefs": {**DEFAULT_PREFS, **mode_prefs},
+                    }
+                    result = subprocess.run(
+                        [sys.executable, __file__, "--child", json.dumps(config)],
+                        capture_output=True,
+                        text=True,
+                    )
+                    if result.returncode != 0:
+                        sys.exit(result.stderr)
+                    if index == 0:
+                        continue
+                    run = json.loads(result.stdout.splitlines()[-1])
+                    results[-1]["runs"].append(run)
+                    print_run(mode_name, book_fmt, run)
+
+    print()
+    for result in results:
+        check_scaling(result, args.threshold)
+    check_outputs(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+def print_run(mode: str, book_fmt: str, run: dict) -> None:
+    stages = ", ".join(
+        f"{name} {stage['wall_seconds']:.2f}s"
+        for name, stage in run["stages"].items()
+        if stage["wall_seconds"] >= 0.01
+    )
+    peak_rss = run["peak_rss_mb"]
+    print(
+        f"{mode} {book_fmt} {run['words']} words: {run['wall_seconds']:.2f}s, "
+        f"{run['words'] / run['wall_seconds']:.0f} words/s, "
+        f"peak RSS {'?' if peak_rss is None else f'{peak_rss:.0f}'} MB | {stages}"
+    )
+
+
+def check_outputs(results: list[dict]) -> None:
+    expected = {}
+    for result in results:
+        for run in result["runs"]:
+            key = (result["format"], run["words"])
+            if key not in expected:
+                expected[key] = (result["mode"], run["output_digest"])
+            elif expected[key][1] != run["output_digest"]:
+                print(
+                    f"DIFFERENT OUTPUT: {result['mode']} {result['format']} "
+                    f"{run['words']} words, compared with {expected[key][0]}"
+                )
+
+
+def check_scaling(result: dict, threshold: float) -> None:
+    runs = result["runs"]
+    name = f"{result['mode']} {result['format']}"
+    # model loading and lemma files don't depend on the book size
+    total = slope(
+        [
+            (
+                run["words"],
+                run["wall_seconds"]
+                - run["stages"].get("setup", {}).get("wall_seconds", 0),
+            )
+            for run in runs
+        ]
+    )
+    if total is None:
+        return
+    print(f"{name}: scaling exponent {total:.2f}")
+    largest = max(runs, key=lambda x: x["words"])
+    for stage_name, stage in largest["stages"].items():
+        # ignore steps that don't take a noticeable part of the time
+        if (
+            stage_name == "setup"
+            or stage["wall_seconds"] < 0.05 * largest["wall_seconds"]
+        ):
+            continue
+        stage_slope = slope(
+            [
+                (run["words"], run["stages"][stage_name]["wall_seconds"])
+                for run in runs
+                if stage_name in run["stages"]
+            ]
+        )
+        if stage_slope is not None and stage_slope > threshold:
+            print(f"  SUPER-LINEAR {stage_name}: exponent {stage_slope:.2f}")
+    if total > threshold:
+        print(f"  SUPER-LINEAR total: exponent {total:.2f}")
+
+
+if __name__ == "__main__":
+    main()
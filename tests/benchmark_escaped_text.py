@@ -0,0 +1,53 @@
+"""
+Compare the cost of finding a token in MOBI paragraphs of different lengths,
+run from the repository folder:
+
+python -m tests.benchmark_escaped_text
+"""
+
+import argparse
+import timeit
+from html import escape
+
+from parse_job import index_in_escaped_text
+
+parser = argparse.ArgumentParser()
+parser.add_argument("-n", type=int, default=2000, help="matches per measurement")
+parser.add_argument(
+    "-t",
+    "--token",
+    default="daughter",
+    help="token to find, tokens not in the text unescaped scan the whole paragraph",
+)
+args = parser.parse_args()
+
+
+def slice_index_in_escaped_text(
+    token: str, escaped_text: str, start_offset: int
+) -> tuple[int, int] | None:
+    # previous implementation
+    if token not in escaped_text[start_offset:]:
+        token = escape(token, False).encode("ascii", "xmlcharrefreplace").decode()
+
+    if token in escaped_text[start_offset:]:
+        token_start = escaped_text.index(token, start_offset)
+        return token_start, token_start + len(token)
+    else:
+        return None
+
+
+sentence = "The caf&#233; owner&#8217;s daughter said &quot;bonjour&quot; to us. "
+filler = "It was a long and quiet evening on the river. "
+print(f"{'chars':>10} {'slice us/match':>15} {'find us/match':>15}")
+for repeat in (1, 10, 100, 1000, 10000):
+    # the token is close to the start offset, slicing copies the rest of the text
+    text = sentence + filler * repeat
+    start = len("The ")
+    results = []
+    for func in (slice_index_in_escaped_text, index_in_escaped_text):
+        assert func(args.token, text, start) == slice_index_in_escaped_text(
+            args.token, text, start
+        )
+        seconds = timeit.timeit(lambda: func(args.token, text, start), number=args.n)
+        results.append(seconds / args.n * 1_000_000)
+    print(f"{len(text):>10} {results[0]:>15.3f} {results[1]:>15.3f}")
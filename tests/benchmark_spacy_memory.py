@@ -0,0 +1,153 @@
+"""
+Compare the load time and memory usage of spaCy models loaded with and
+without the "Reduce spaCy memory usage" option, and check both pipelines
+create the same annotations.
+
+python benchmark_spacy_memory.py de en fr
+python benchmark_spacy_memory.py --write  # all languages, save to languages.json
+"""
+
+import argparse
+import hashlib
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_PATH = Path(__file__).resolve().parent.parent
+LANGUAGES_PATH = REPO_PATH / "data/languages.json"
+SAMPLE_TEXT = (
+    "Solomon Northup was born in Minerva, New York, in July 1808. "
+    "He worked on the Champlain Canal and played the violin in Saratoga Springs."
+)
+
+
+def run_child(config: dict) -> None:
+    for path in config["libs"]:
+        sys.path.insert(0, path)
+    sys.path.insert(0, str(REPO_PATH))
+    from parse_job import load_spacy
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        start = time.perf_counter()
+        # book path enables NER like X-Ray jobs
+        nlp = load_spacy(
+            config["model"],
+            str(Path(tmp_dir) / "book.epub"),
+            config["lang"],
+            None,
+            config["low_memory"],
+        )
+        load_seconds = time.perf_counter() - start
+    doc = nlp(SAMPLE_TEXT)
+    annotations = [
+        (t.text, t.tag_, t.pos_, t.lemma_, t.ent_iob_, t.ent_type_, t.is_sent_start)
+        for t in doc
+    ]
+    print(
+        json.dumps(
+            {
+                "load_seconds": round(load_seconds, 3),
+                "peak_rss_mb": peak_rss_mb(),
+                **smaps_rollup_mb(),
+                "annotations": hashlib.sha1(
+                    json.dumps(annotations).encode("utf-8")
+                ).hexdigest(),
+            }
+        )
+    )
+
+
+def peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(max_rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def smaps_rollup_mb() -> dict[str, float]:
+    # memory-mapped vectors count in RSS but the pages are shared, compare
+    # the proportional and private memory on Linux
+    path = Path("/proc/self/smaps_rollup")
+    if not path.exists():
+        return {}
+    result = {}
+    private = 0
+    for line in path.read_text().splitlines():
+        name, _, value = line.partition(":")
+        if name == "Pss":
+            result["pss_mb"] = round(int(value.split()[0]) / 1024, 1)
+        elif name in ("Private_Clean", "Private_Dirty"):
+            private += int(value.split()[0])
+    result["private_mb"] = round(private / 1024, 1)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("languages", nargs="*", help="default: all spaCy languages")
+    parser.add_argument("--libs", nargs="*", default=[], help="extra sys.path")
+    parser.add_argument(
+        "--write", action="store_true", help="save the results to languages.json"
+    )
+    args = parser.parse_args()
+    if args.child:
+        run_child(json.loads(args.child))
+        return
+
+    with LANGUAGES_PATH.open(encoding="utf-8") as f:
+        languages = json.load(f)
+    failed = False
+    for lang in args.languages or languages:
+        model = languages[lang]["spacy"]
+        if model == "":
+            continue
+        results = {}
+        for low_memory in (False, True):
+            config = {
+                "model": model,
+                "lang": lang,
+                "low_memory": low_memory,
+                "libs": args.libs,
+            }
+            result = subprocess.run(
+                [sys.executable, __file__, "--child", json.dumps(config)],
+                capture_output=True,
+                text=True,
+            )
+            if result.returncode != 0:
+                sys.exit(result.stderr)
+            results["low_memory" if low_memory else "default"] = json.loads(
+                result.stdout.splitlines()[-1]
+            )
+
+        default, low_memory = results["default"], results["low_memory"]
+        same = default.pop("annotations") == low_memory.pop("annotations")
+        failed = failed or not same
+        print(
+            f"{lang} {model}: load {default['load_seconds']:.2f}s -> "
+            f"{low_memory['load_seconds']:.2f}s, "
+            + ", ".join(
+                f"{key} {default[key]} -> {low_memory[key]}"
+                for key in ("peak_rss_mb", "pss_mb", "private_mb")
+                if key in default
+            )
+            + ("" if same else ", DIFFERENT ANNOTATIONS")
+        )
+        if args.write and same:
+            languages[lang]["spacy_memory"] = results
+
+    if args.write:
+        with LANGUAGES_PATH.open("w", encoding="utf-8") as f:
+            json.dump(languages, f, indent=2, sort_keys=True, ensure_ascii=False)
+            f.write("\n")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Compare the time used to find Word Wise phrases with spaCy's PhraseMatcher
+and filter_spans() and with TokenMatcher, both find the same phrases.
+
+python -m tests.benchmark_token_matcher --lemmas 30000 --paragraphs 20000
+"""
+
+import argparse
+import random
+import time
+
+import spacy
+from spacy.matcher import PhraseMatcher
+from spacy.util import filter_spans
+
+from token_matcher import TokenMatcher
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--lemmas", type=int, default=30000)
+parser.add_argument("--paragraphs", type=int, default=20000)
+parser.add_argument("--words", type=int, default=40, help="words per paragraph")
+args = parser.parse_args()
+
+rng = random.Random(0)
+letters = "abcdefghijklmnopqrstuvwxyz"
+vocab = list(
+    {"".join(rng.choices(letters, k=rng.randint(2, 8))) for _ in range(args.lemmas)}
+)
+# like Word Wise lemmas, most are one word, some are phrases
+lemmas = {
+    " ".join(rng.choices(vocab, k=rng.choices([1, 2, 3], [8, 3, 1])[0]))
+    for _ in range(args.lemmas)
+}
+nlp = spacy.blank("en")
+docs = [
+    nlp.make_doc(" ".join(rng.choices(vocab, k=args.words)))
+    for _ in range(args.paragraphs)
+]
+keywords = [[token.lower for token in nlp.make_doc(lemma)] for lemma in lemmas]
+
+start = time.perf_counter()
+phrase_matcher = PhraseMatcher(nlp.vocab, attr="LOWER")
+phrase_matcher.add("lemmas", [nlp.make_doc(lemma) for lemma in lemmas])
+phrase_build = time.perf_counter() - start
+start = time.perf_counter()
+phrase_results = [
+    [
+        (span.start, span.end)
+        for span in filter_spans(phrase_matcher(doc, as_spans=True))
+    ]
+    for doc in docs
+]
+phrase_match = time.perf_counter() - start
+
+start = time.perf_counter()
+token_matcher = TokenMatcher(keywords)
+token_build = time.perf_counter() - start
+start = time.perf_counter()
+token_results = [token_matcher(doc) for doc in docs]
+token_match = time.perf_counter() - start
+
+print(f"{len(lemmas)} lemmas, {len(docs)} paragraphs of {args.words} words")
+print(f"PhraseMatcher: build {phrase_build:.2f}s, match {phrase_match:.2f}s")
+print(f"TokenMatcher: build {token_build:.2f}s, match {token_match:.2f}s")
+print(
+    f"{sum(map(len, token_results))} matches, "
+    + ("same results" if phrase_results == token_results else "DIFFERENT RESULTS")
+)
@@ -0,0 +1,52 @@
+"""
+Check the tokenizer-only pipeline used to dump the Word Wise lemmas creates
+the same tokens as the full spaCy pipeline, run from the repository folder:
+
+python -m tests.check_lemma_tokenizer en_core_web_lg en path/to/lemmas.db
+"""
+
+import argparse
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+import spacy
+
+from dump_lemmas import load_lemma_tokenizer
+
+parser = argparse.ArgumentParser()
+parser.add_argument("model", help="spaCy model package name, e.g. en_core_web_lg")
+parser.add_argument("lemma_lang", help="language code of the lemmas")
+parser.add_argument("db_path", type=Path, help="Kindle or Wiktionary lemmas database")
+args = parser.parse_args()
+
+query_sql = """
+SELECT DISTINCT lemma FROM senses WHERE enabled = 1
+UNION
+SELECT DISTINCT form FROM forms
+"""
+with sqlite3.connect(args.db_path) as conn:
+    lemmas = [lemma.lower() for (lemma,) in conn.execute(query_sql) if lemma]
+
+pipelines = {}
+for name, load in (
+    ("full", lambda: spacy.load(args.model)),
+    ("tokenizer", lambda: load_lemma_tokenizer(args.model, args.lemma_lang)),
+):
+    start = time.perf_counter()
+    pipelines[name] = load()
+    print(f"{name:>10}: loaded in {time.perf_counter() - start:.2f}s")
+
+full_tokenizer = pipelines["full"].tokenizer
+tokenizer = pipelines["tokenizer"].tokenizer
+different = 0
+for lemma in lemmas:
+    expected = [(t.text, t.lower) for t in full_tokenizer(lemma)]
+    tokens = [(t.text, t.lower) for t in tokenizer(lemma)]
+    if expected != tokens:
+        different += 1
+        if different <= 20:
+            print(f"{lemma!r}: {expected} != {tokens}")
+print(f"{len(lemmas)} lemmas, {different} tokenized differently")
+sys.exit(1 if different > 0 else 0)
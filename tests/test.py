@@ -1,5 +1,6 @@
 import json
 import logging
+import os
 import sqlite3
 import subprocess
 import sys
@@ -22,6 +23,7 @@ class TestDumbCode(unittest.TestCase):
         prefs["use_wiktionary_for_kindle"] = False
         prefs["python_path"] = which("python3")
         prefs["custom_entity_only"] = False
+        prefs["lemma_matcher"] = os.environ.get("LEMMA_MATCHER", "phrase_matcher")
 
         lib_db = db("~/Calibre Library").new_api
         for book_id in lib_db.all_book_ids():
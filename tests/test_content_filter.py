@@ -0,0 +1,78 @@
+import unittest
+
+from content_filter import (
+    MAX_TOC_BYTES,
+    ContentFilter,
+    TextNode,
+    mobi_tag_before,
+    mobi_toc_range,
+    tag_before,
+)
+
+
+def mobi_html(toc: bytes, after_toc: bytes) -> bytes:
+    head = b'<html><head><guide><reference type="toc" filepos=0000000000 /></guide>'
+    head = head.replace(b"0000000000", b"%010d" % len(head))
+    return head + toc + after_toc
+
+
+class TestContentFilter(unittest.TestCase):
+    def test_skip_nodes(self):
+        content_filter = ContentFilter()
+        nodes = [
+            TextNode(" \n"),
+            TextNode("var x = 1;", "script"),
+            TextNode("* * *", "p"),
+            TextNode("Chapter One", "a", True),
+            TextNode("It was a dark and stormy night.", "p"),
+        ]
+        self.assertEqual(
+            [content_filter.skip(node) for node in nodes],
+            [True, True, True, True, False],
+        )
+        self.assertEqual(
+            content_filter.removed,
+            {"blank": [1, 2], "code": [1, 10], "no_letters": [1, 5], "toc": [1, 11]},
+        )
+
+    def test_first_filter_counts(self):
+        content_filter = ContentFilter()
+        # blank and no letters, only counted as blank
+        self.assertTrue(content_filter.skip(TextNode("   ", "script")))
+        self.assertEqual(content_filter.removed, {"blank": [1, 3]})
+
+    def test_tag_before(self):
+        html = '<p class="x">text</p><!-- comment -->more'
+        self.assertEqual(tag_before(html, html.index("text")), "p")
+        self.assertEqual(tag_before(html, html.index("more")), "")
+        self.assertEqual(tag_before("no tags", 3), "")
+        body = b"<body><H2>Title</H2></body>"
+        self.assertEqual(mobi_tag_before(body, body.index(b"Title")), "h2")
+
+
+class TestMobiTocRange(unittest.TestCase):
+    def test_end_at_page_break(self):
+        toc = b"<p>Contents</p><p>One</p>"
+        html = mobi_html(toc, b"<mbp:pagebreak/><p>Chapter text</p>")
+        toc_start = html.index(toc)
+        self.assertEqual(mobi_toc_range(html), (toc_start, toc_start + len(toc)))
+
+    def test_end_at_link_target(self):
+        toc = b"<p>Contents</p><p><a filepos=0000000000>One</a></p>"
+        chapter = b"<h2>One</h2><p>Chapter text</p>"
+        html = mobi_html(toc, chapter)
+        toc_start = html.index(toc)
+        chapter_start = html.index(chapter)
+        html = html.replace(b"0000000000", b"%010d" % chapter_start)
+        self.assertEqual(mobi_toc_range(html), (toc_start, chapter_start))
+
+    def test_no_end_marker(self):
+        html = mobi_html(b"<p>Contents</p>", b"<p>text</p>" * (MAX_TOC_BYTES // 10))
+        self.assertIsNone(mobi_toc_range(html))
+
+    def test_no_toc_reference(self):
+        self.assertIsNone(mobi_toc_range(b"<html><body><p>text</p></body></html>"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+from database import create_lang_layer
+
+
+class TestGlossWriter(unittest.TestCase):
+    def test_glosses(self):
+        glosses = [
+            (10, None, 1, 100),
+            (20, 35, 2, 200),
+            (40, None, 3, 300),
+            (50, 58, 4, 400),
+            (60, None, 5, 500),
+        ]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            book_path = str(Path(tmp_dir) / "book.azw3")
+            writer = create_lang_layer("ASIN", book_path, "acr", "revision")
+            # flush in the middle and at the end
+            writer.batch_size = 2
+            for gloss in glosses:
+                writer.add(*gloss)
+            self.assertEqual(writer.count, len(glosses))
+            writer.close()
+
+            self.assertEqual(
+                [path.name for path in Path(tmp_dir).iterdir()],
+                ["LanguageLayer.en.ASIN.kll"],
+            )
+            conn = sqlite3.connect(Path(tmp_dir) / "LanguageLayer.en.ASIN.kll")
+            self.assertEqual(
+                conn.execute(
+                    "SELECT start, end, difficulty, sense_id, low_confidence "
+                    "FROM glosses ORDER BY start"
+                ).fetchall(),
+                [gloss + (0,) for gloss in glosses],
+            )
+            conn.close()
+
+    def test_abort(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            book_path = str(Path(tmp_dir) / "book.azw3")
+            writer = create_lang_layer("ASIN", book_path, "acr", "revision")
+            writer.batch_size = 1
+            writer.add(10, None, 1, 100)
+            writer.abort()
+            self.assertEqual(list(Path(tmp_dir).iterdir()), [])
+            with self.assertRaises(sqlite3.ProgrammingError):
+                writer.conn.execute("SELECT 1")
+
+
+if __name__ == "__main__":
+    unittest.main()
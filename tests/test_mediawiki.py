@@ -0,0 +1,147 @@
+import sqlite3
+import tempfile
+import threading
+import unittest
+import unittest.mock
+from pathlib import Path
+
+import requests
+
+try:
+    import lxml
+except ImportError:
+    lxml = None
+
+from mediawiki import MEDIAWIKI_API_EXLIMIT, MediaWiki
+from utils import get_mediawiki_db_path
+from x_ray_share import XRayEntity
+
+API_URL = "https://wiki.example.org/w/api.php"
+
+
+class FakeResponse:
+    ok = True
+    status_code = 200
+
+    def __init__(self, data: dict) -> None:
+        self.data = data
+        self.headers: dict[str, str] = {}
+
+    def json(self) -> dict:
+        return self.data
+
+    def close(self) -> None:
+        pass
+
+
+class FakeSession:
+    """
+    Answer extracts API requests, titles end with a multiple of 5 are
+    redirected and titles end with a multiple of 7 don't have a page. Raise
+    `ChunkedEncodingError` for the first request has `fail_title`.
+    """
+
+    def __init__(self, fail_title: str | None = None) -> None:
+        self.fail_title = fail_title
+        self.lock = threading.Lock()
+        self.requested_titles: list[list[str]] = []
+
+    def get(self, url: str, params: dict) -> FakeResponse:
+        titles = params["titles"].split("|")
+        with self.lock:
+            self.requested_titles.append(titles)
+            if self.fail_title in titles:
+                self.fail_title = None
+                raise requests.exceptions.ChunkedEncodingError()
+        redirects = []
+        pages = []
+        for title in titles:
+            number = int(title.split()[-1])
+            if number % 7 == 0:
+                pages.append({"title": title, "missing": True})
+                continue
+            page_title = title
+            if number % 5 == 0:
+                page_title = f"Page {number}"
+                redirects.append({"from": title, "to": page_title})
+            pages.append(
+                {
+                    "title": page_title,
+                    "extract": f"{page_title} intro.\nMore text.",
+                    "pageprops": {"wikibase_item": f"Q{number}"},
+                }
+            )
+        return FakeResponse({"query": {"redirects": redirects, "pages": pages}})
+
+    def close(self) -> None:
+        pass
+
+
+@unittest.skipIf(lxml is None, "lxml is not installed")
+class TestMediaWikiPrefetch(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.titles = [
+            f"Name {number}" for number in range(1, 3 * MEDIAWIKI_API_EXLIMIT + 10)
+        ]
+
+    def create_mediawiki(
+        self, folder: str, session: FakeSession, max_requests: int, prefetch: bool
+    ) -> MediaWiki:
+        plugin_path = Path(self.temp_dir.name, folder, "worddumb.zip")
+        plugin_path.parent.mkdir()
+        with (
+            unittest.mock.patch.object(
+                MediaWiki, "init_requests_session", return_value=session
+            ),
+            unittest.mock.patch.object(MediaWiki, "get_api_info"),
+        ):
+            mediawiki = MediaWiki(
+                API_URL, "en", "", plugin_path, "", max_requests, prefetch
+            )
+        mediawiki.has_extracts_api = True
+        return mediawiki
+
+    def query(
+        self, folder: str, session: FakeSession, max_requests: int, prefetch: bool
+    ) -> tuple[dict[str, XRayEntity], list[tuple]]:
+        mediawiki = self.create_mediawiki(folder, session, max_requests, prefetch)
+        entities = {
+            title: XRayEntity(index, "", "PERSON", 3)
+            for index, title in enumerate(self.titles)
+        }
+        if prefetch:
+            for title in entities:
+                mediawiki.prefetch(title)
+        mediawiki.query(entities)
+        mediawiki.close()
+        conn = sqlite3.connect(
+            get_mediawiki_db_path(
+                "en", API_URL, Path(self.temp_dir.name, folder, "worddumb.zip")
+            )
+        )
+        rows = conn.execute("SELECT * FROM pages ORDER BY title").fetchall()
+        conn.close()
+        return entities, rows
+
+    def test_failed_prefetch_batch(self):
+        expected = self.query("no_prefetch", FakeSession(), 1, False)
+        for max_requests in (1, 2):
+            with self.subTest(max_requests=max_requests):
+                fail_title = self.titles[MEDIAWIKI_API_EXLIMIT]
+                session = FakeSession(fail_title)
+                self.assertEqual(
+                    self.query(f"prefetch_{max_requests}", session, max_requests, True),
+                    expected,
+                )
+                self.assertIsNone(session.fail_title)
+                # the failed batch is requested again
+                self.assertEqual(
+                    sum(fail_title in titles for titles in session.requested_titles),
+                    2,
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
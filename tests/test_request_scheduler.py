@@ -0,0 +1,120 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from request_scheduler import (
+    INCREASE_AFTER_REQUESTS,
+    MAX_RETRY_AFTER_SECONDS,
+    RequestScheduler,
+    parse_retry_after,
+)
+
+
+class FakeResponse:
+    def __init__(self, status_code: int = 200, headers: dict[str, str] = {}) -> None:
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.closed = False
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class FakeSession:
+    """
+    Return or raise the given results in order.
+    """
+
+    def __init__(self, results: list[FakeResponse | Exception]) -> None:
+        self.results = results
+        self.requests = 0
+
+    def get(self, url: str, **kwargs) -> FakeResponse:
+        result = self.results[self.requests]
+        self.requests += 1
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+class TestParseRetryAfter(unittest.TestCase):
+    def test_seconds(self):
+        self.assertEqual(parse_retry_after("120"), 120)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after("soon"))
+
+    def test_http_date(self):
+        retry_date = datetime.now(timezone.utc) + timedelta(seconds=30)
+        self.assertAlmostEqual(
+            parse_retry_after(format_datetime(retry_date, usegmt=True)), 30, delta=2
+        )
+        self.assertEqual(parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0)
+
+
+class TestRequestScheduler(unittest.TestCase):
+    def test_retry_maxlag(self):
+        maxlag = FakeResponse(
+            200, {"MediaWiki-API-Error": "maxlag", "Retry-After": "0"}
+        )
+        ok = FakeResponse()
+        session = FakeSession([maxlag, ok])
+        scheduler = RequestScheduler(session)
+        self.assertIs(scheduler.get("url"), ok)
+        self.assertEqual(session.requests, 2)
+        self.assertEqual(scheduler.retries, 1)
+        self.assertTrue(maxlag.closed)
+
+    def test_give_up_long_retry_after(self):
+        for retry_after in [
+            str(MAX_RETRY_AFTER_SECONDS + 1),
+            "Wed, 21 Oct 2099 07:28:00 GMT",
+        ]:
+            throttled = FakeResponse(429, {"Retry-After": retry_after})
+            session = FakeSession([throttled, FakeResponse()])
+            scheduler = RequestScheduler(session)
+            self.assertIs(scheduler.get("url"), throttled)
+            self.assertEqual(session.requests, 1)
+            self.assertEqual(scheduler.in_flight, 0)
+
+    def test_return_last_response_after_retries(self):
+        session = FakeSession([FakeResponse(503, {"Retry-After": "0"})] * 3)
+        scheduler = RequestScheduler(session, max_retries=2)
+        self.assertEqual(scheduler.get("url").status_code, 503)
+        self.assertEqual(session.requests, 3)
+
+    def test_halve_and_increase_limit(self):
+        throttled = FakeResponse(429, {"Retry-After": "0"})
+        session = FakeSession(
+            [throttled, throttled] + [FakeResponse()] * (INCREASE_AFTER_REQUESTS + 1)
+        )
+        scheduler = RequestScheduler(session, max_requests=4)
+        scheduler.get("url")
+        self.assertEqual(scheduler.limit, 1)
+        for _ in range(INCREASE_AFTER_REQUESTS):
+            scheduler.get("url")
+        self.assertEqual(scheduler.limit, 2)
+
+    def test_release_slot_on_exception(self):
+        session = FakeSession(
+            [requests.exceptions.ChunkedEncodingError(), FakeResponse()]
+        )
+        scheduler = RequestScheduler(session)
+        with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+            scheduler.get("url")
+        self.assertEqual(scheduler.in_flight, 0)
+        self.assertEqual(scheduler.get("url").status_code, 200)
+
+    def test_release_slot_after_connection_errors(self):
+        session = FakeSession([requests.ConnectionError(), FakeResponse()])
+        scheduler = RequestScheduler(session, max_retries=0)
+        with self.assertRaises(requests.ConnectionError):
+            scheduler.get("url")
+        self.assertEqual(scheduler.in_flight, 0)
+        self.assertEqual(scheduler.get("url").status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import random
+import unittest
+
+from token_matcher import TokenMatcher, filter_matches
+
+try:
+    import spacy
+except ImportError:
+    spacy = None
+
+LEMMAS = [
+    "a",
+    "a lot",
+    "a lot of",
+    "lot",
+    "lot of",
+    "give",
+    "give up",
+    "give up on",
+    "up",
+    "up to",
+    "look",
+    "look up",
+    "look up to",
+    "on",
+    "to",
+    "turn up",
+    "up on",
+]
+WORDS = ["A", "lot", "of", "give", "Up", "on", "to", "look", "turn", "the", "."]
+
+
+class TestFilterMatches(unittest.TestCase):
+    def test_longest_first(self):
+        self.assertEqual(
+            filter_matches([(0, 1), (0, 2), (1, 4), (3, 4), (5, 6)], 6),
+            [(0, 1), (1, 4), (5, 6)],
+        )
+
+    def test_same_length_keeps_first(self):
+        self.assertEqual(filter_matches([(1, 3), (0, 2), (2, 4)], 4), [(0, 2), (2, 4)])
+
+
+@unittest.skipIf(spacy is None, "spaCy is not installed")
+class TestTokenMatcher(unittest.TestCase):
+    def test_same_as_phrase_matcher(self):
+        from spacy.matcher import PhraseMatcher
+        from spacy.util import filter_spans
+
+        nlp = spacy.blank("en")
+        keywords = [[token.lower for token in nlp.make_doc(x)] for x in LEMMAS]
+        phrase_matcher = PhraseMatcher(nlp.vocab, attr="LOWER")
+        phrase_matcher.add("lemmas", [nlp.make_doc(x) for x in LEMMAS])
+        token_matcher = TokenMatcher(keywords)
+
+        rng = random.Random(0)
+        for _ in range(500):
+            doc = nlp.make_doc(" ".join(rng.choices(WORDS, k=rng.randint(0, 30))))
+            expected = [
+                (span.start, span.end)
+                for span in filter_spans(phrase_matcher(doc, as_spans=True))
+            ]
+            self.assertEqual(token_matcher(doc), expected, doc.text)
+
+
+if __name__ == "__main__":
+    unittest.main()
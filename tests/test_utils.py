@@ -0,0 +1,93 @@
+import subprocess
+import sys
+import threading
+import unittest
+import unittest.mock
+
+from utils import run_lanes, run_subprocess_with_progress, split_lanes
+
+
+class TestLanes(unittest.TestCase):
+    def test_split_one_language(self):
+        self.assertEqual(split_lanes(["en", "en"], str, 2), [["en"], ["en"]])
+
+    def test_split_languages(self):
+        self.assertEqual(
+            split_lanes(["en", "de", "en", "en", "de", "fr"], str, 3),
+            [["de", "de"], ["en", "en"], ["en", "fr"]],
+        )
+
+    def test_more_lanes_than_jobs(self):
+        self.assertEqual(split_lanes(["en"], str, 4), [["en"]])
+        self.assertEqual(split_lanes([], str, 4), [[]])
+
+    def test_run_two_workers(self):
+        # both jobs have to run at the same time to pass the barrier
+        barrier = threading.Barrier(2, timeout=10)
+
+        def run_job(job: str, worker_id: int) -> int:
+            barrier.wait()
+            return worker_id
+
+        self.assertEqual(
+            sorted(run_lanes(split_lanes(["en", "en"], str, 2), run_job)), [0, 1]
+        )
+
+
+def popen(args: list[str]) -> subprocess.Popen[bytes]:
+    return subprocess.Popen(
+        args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+
+
+class TestRunSubprocess(unittest.TestCase):
+    def run_python(self, code: str, notifications: object) -> None:
+        with unittest.mock.patch("utils.start_subprocess", popen):
+            run_subprocess_with_progress([sys.executable, "-c", code], notifications)
+
+    def test_skip_lines_not_json(self):
+        notifications = unittest.mock.Mock()
+        self.run_python(
+            "import json; print('loading'); "
+            "print(json.dumps({'progress': [0.5, 'half']}))",
+            notifications,
+        )
+        notifications.put.assert_called_once_with((0.5, "half"))
+
+    def test_error_output(self):
+        with self.assertRaises(subprocess.CalledProcessError) as cm:
+            self.run_python(
+                "import sys; print('stray'); sys.exit('failed')",
+                unittest.mock.Mock(),
+            )
+        self.assertEqual(cm.exception.output.strip(), b"stray")
+        self.assertIn(b"failed", cm.exception.stderr)
+
+    def test_kill_on_exception(self):
+        notifications = unittest.mock.Mock()
+        notifications.put.side_effect = KeyError
+        processes = []
+
+        def start(args: list[str]) -> subprocess.Popen[bytes]:
+            processes.append(popen(args))
+            return processes[-1]
+
+        with (
+            unittest.mock.patch("utils.start_subprocess", start),
+            self.assertRaises(KeyError),
+        ):
+            run_subprocess_with_progress(
+                [
+                    sys.executable,
+                    "-c",
+                    "import json, time; "
+                    "print(json.dumps({'progress': [0, '']}), flush=True); "
+                    "time.sleep(60)",
+                ],
+                notifications,
+            )
+        self.assertIsNotNone(processes[0].returncode)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,208 @@
+import random
+import string
+import unittest
+import unittest.mock
+from functools import partial
+
+from x_ray_share import (
+    FUZZ_THRESHOLD,
+    CustomX,
+    EntityResolver,
+    XRayEntity,
+    cluster_entities,
+    is_full_name,
+)
+
+try:
+    from rapidfuzz.fuzz import token_set_ratio
+    from rapidfuzz.process import extractOne
+    from rapidfuzz.utils import default_process
+except ImportError:
+    extractOne = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def random_names(seed: int, count: int) -> list[str]:
+    """
+    Names made of a few hundred random words, some have a typo, so names
+    could match by sharing a word or only by the character bigrams.
+    """
+    rng = random.Random(seed)
+    syllables = ["an", "ber", "ca", "de", "el", "fo", "ha", "jo", "li", "mo", "th"]
+    words = [
+        "".join(rng.choice(syllables) for _ in range(rng.randint(1, 3))).capitalize()
+        for _ in range(300)
+    ]
+    names = []
+    for _ in range(count):
+        if rng.random() < 0.05:
+            names.append(rng.choice(["Dr.", "Mr", "A", "I'm", "x y", "..."]))
+            continue
+        name = list(" ".join(rng.choice(words) for _ in range(rng.randint(1, 3))))
+        if rng.random() < 0.3:
+            name[rng.randrange(len(name))] = rng.choice(string.ascii_letters + " .-")
+        names.append("".join(name))
+    return names
+
+
+@unittest.skipIf(extractOne is None, "rapidfuzz is not installed")
+class TestEntityResolver(unittest.TestCase):
+    def extract_one(self, name: str, names: dict[str, None]) -> str | None:
+        r = extractOne(
+            name,
+            names.keys(),
+            score_cutoff=FUZZ_THRESHOLD,
+            scorer=partial(token_set_ratio, processor=default_process),
+        )
+        return r[0] if r else None
+
+    def test_same_match_as_extract_one(self):
+        for seed in range(3):
+            rng = random.Random(seed)
+            names: dict[str, None] = {}
+            resolver = EntityResolver()
+            for name in random_names(seed, 1000):
+                if name in names:
+                    continue
+                matched_name = self.extract_one(name, names)
+                self.assertEqual(resolver.find(name), matched_name, name)
+                if matched_name is None:
+                    names[name] = None
+                    resolver.add(name)
+                elif rng.random() < 0.3:
+                    # renamed to the full name, moved to the end
+                    del names[matched_name]
+                    names[name] = None
+                    resolver.remove(matched_name)
+                    resolver.add(name)
+
+    def test_match_without_common_word(self):
+        resolver = EntityResolver()
+        resolver.add("Hermione Granger")
+        self.assertEqual(resolver.find("Hermoine Granger"), "Hermione Granger")
+        self.assertEqual(resolver.find("Hermoine"), None)
+        resolver.add("Hermione")
+        self.assertEqual(resolver.find("Hermoine"), "Hermione")
+
+    def test_keep_first_best_match(self):
+        resolver = EntityResolver()
+        names = dict.fromkeys(["Harry Potter", "Harry", "Potter"])
+        for name in names:
+            resolver.add(name)
+        self.assertEqual(resolver.find("Harry"), self.extract_one("Harry", names))
+        self.assertEqual(resolver.find("Harry"), "Harry Potter")
+        resolver.remove("Harry Potter")
+        resolver.add("Harry Potter")
+        self.assertEqual(resolver.find("harry"), "Harry")
+
+    def test_no_words(self):
+        resolver = EntityResolver()
+        resolver.add("Harry")
+        self.assertIsNone(resolver.find("..."))
+        self.assertIsNone(EntityResolver().find("Harry"))
+
+
+def random_entities(seed: int, count: int) -> dict[str, XRayEntity]:
+    rng = random.Random(seed)
+    return {
+        name: XRayEntity(index, "", rng.choice(["PERSON", "GPE"]), rng.randint(1, 5))
+        for index, name in enumerate(random_names(seed, count))
+    }
+
+
+def scan_clusters(
+    entities: dict[str, XRayEntity], custom_x_ray: dict[str, CustomX]
+) -> dict[int, int]:
+    """
+    Score each name against every kept name with `extractOne()`.
+    """
+    names = sorted(
+        entities, key=lambda x: (x not in custom_x_ray, -entities[x].count, x)
+    )
+    kept_names: list[str] = []
+    merged_ids = {}
+    for name in names:
+        if len(default_process(name).split()) == 0:
+            continue
+        r = extractOne(
+            name,
+            kept_names,
+            score_cutoff=FUZZ_THRESHOLD,
+            scorer=partial(token_set_ratio, processor=default_process),
+        )
+        if name in custom_x_ray or r is None:
+            kept_names.append(name)
+            continue
+        kept_name, _, kept_index = r
+        kept_entity = entities[kept_name]
+        entity = entities.pop(name)
+        kept_entity.count += entity.count
+        merged_ids[entity.id] = kept_entity.id
+        if is_full_name(kept_name, kept_entity.label, name, entity.label):
+            entities[name] = entities.pop(kept_name)
+            kept_names[kept_index] = name
+    return merged_ids
+
+
+@unittest.skipIf(
+    extractOne is None or numpy is None, "rapidfuzz or numpy is not installed"
+)
+class TestClusterEntities(unittest.TestCase):
+    def test_same_clusters_as_extract_one(self):
+        for seed in range(3):
+            entities = random_entities(seed, 1000)
+            custom_x_ray = {
+                name: CustomX("", 1, False)
+                for name in random.Random(seed).sample(sorted(entities), 20)
+            }
+            expected_entities = random_entities(seed, 1000)
+            expected_ids = scan_clusters(expected_entities, custom_x_ray)
+            self.assertEqual(cluster_entities(entities, custom_x_ray), expected_ids)
+            self.assertEqual(entities, expected_entities)
+
+    def test_chunks(self):
+        entities = random_entities(0, 500)
+        merged_ids = cluster_entities(random_entities(0, 500), {})
+        with unittest.mock.patch("x_ray_share.CLUSTER_CHUNK_SCORES", 7000):
+            self.assertEqual(cluster_entities(entities, {}), merged_ids)
+
+    def test_merge_into_full_name(self):
+        entities = {
+            "Harry": XRayEntity(0, "quote 0", "PERSON", 3),
+            "Hogwarts": XRayEntity(1, "quote 1", "ORG", 2),
+            "Harry Potter": XRayEntity(2, "quote 2", "PERSON", 1),
+            "Hogwart": XRayEntity(3, "quote 3", "ORG", 1),
+        }
+        self.assertEqual(cluster_entities(entities, {}), {2: 0, 3: 1})
+        self.assertEqual(
+            entities,
+            {
+                "Hogwarts": XRayEntity(1, "quote 1", "ORG", 3),
+                "Harry Potter": XRayEntity(0, "quote 0", "PERSON", 4),
+            },
+        )
+
+    def test_keep_custom_names(self):
+        entities = {
+            "Harry": XRayEntity(0, "", "PERSON", 3),
+            "Harry Potter": XRayEntity(1, "", "PERSON", 1),
+        }
+        custom_x_ray = {"Harry Potter": CustomX("", 1, False)}
+        self.assertEqual(cluster_entities(entities, custom_x_ray), {0: 1})
+        self.assertEqual(list(entities), ["Harry Potter"])
+
+    def test_order_independent(self):
+        entities = random_entities(1, 500)
+        reversed_entities = dict(reversed(random_entities(1, 500).items()))
+        self.assertEqual(
+            cluster_entities(entities, {}), cluster_entities(reversed_entities, {})
+        )
+        self.assertEqual(entities, reversed_entities)
+
+
+if __name__ == "__main__":
+    unittest.main()
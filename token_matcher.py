@@ -0,0 +1,84 @@
+"""
+Aho-Corasick automaton of token LOWER hashes, finds the same Word Wise
+phrases as spaCy's PhraseMatcher(attr="LOWER") and filter_spans() without
+creating Span objects.
+"""
+
+from typing import Any, Iterable
+
+
+class TokenMatcher:
+    def __init__(self, keywords: Iterable[list[int]]) -> None:
+        # node 0 is the root
+        self.goto: list[dict[int, int]] = [{}]
+        self.fail: list[int] = [0]
+        # lengths of the phrases end at the node, include the fail nodes
+        self.output: list[tuple[int, ...]] = [()]
+        for keyword in keywords:
+            if len(keyword) > 0:
+                self.add(keyword)
+        self.build_fail_links()
+
+    def add(self, keyword: list[int]) -> None:
+        node = 0
+        for lower in keyword:
+            next_node = self.goto[node].get(lower)
+            if next_node is None:
+                next_node = len(self.goto)
+                self.goto[node][lower] = next_node
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(())
+            node = next_node
+        if len(keyword) not in self.output[node]:
+            self.output[node] += (len(keyword),)
+
+    def build_fail_links(self) -> None:
+        queue = list(self.goto[0].values())
+        for node in queue:
+            for lower, child in self.goto[node].items():
+                fail_node = self.fail[node]
+                while fail_node != 0 and lower not in self.goto[fail_node]:
+                    fail_node = self.fail[fail_node]
+                fail_node = self.goto[fail_node].get(lower, 0)
+                self.fail[child] = fail_node
+                self.output[child] += self.output[fail_node]
+                queue.append(child)
+
+    def find_matches(self, lowers: list[int]) -> list[tuple[int, int]]:
+        """
+        Return all (start, end) token indexes of the phrases.
+        """
+        matches = []
+        node = 0
+        for index, lower in enumerate(lowers):
+            while node != 0 and lower not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(lower, 0)
+            for length in self.output[node]:
+                matches.append((index + 1 - length, index + 1))
+        return matches
+
+    def __call__(self, doc: Any) -> list[tuple[int, int]]:
+        from spacy.attrs import LOWER
+
+        return filter_matches(self.find_matches(doc.to_array(LOWER).tolist()), len(doc))
+
+
+def filter_matches(
+    matches: list[tuple[int, int]], doc_len: int
+) -> list[tuple[int, int]]:
+    """
+    Keep the longest non-overlapping matches, prefer the first match if they
+    have the same length. Same as spacy.util.filter_spans().
+    """
+    if len(matches) < 2:
+        return matches
+    result = []
+    seen_tokens = bytearray(doc_len)
+    for start, end in sorted(matches, key=lambda x: (x[1] - x[0], -x[0]), reverse=True):
+        if not seen_tokens[start] and not seen_tokens[end - 1]:
+            result.append((start, end))
+            seen_tokens[start:end] = b"\x01" * (end - start)
+    result.sort()
+    return result
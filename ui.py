@@ -11,7 +11,7 @@ from PyQt6.QtGui import QIcon
 from .custom_x_ray import CustomXRayDialog
 from .error_dialogs import job_failed, unsupported_ww_lang_dialog
 from .metadata import MetaDataResult, check_metadata
-from .parse_job import ParseJobData, do_job
+from .parse_job import ParseJobData, delete_preview_docs, do_job
 from .send_file import SendFile, device_connected
 from .utils import donate, get_book_settings_path
 
@@ -201,6 +201,8 @@ def done(job, gui=None, notif=None):
                 killable=False,
             )
             gui.job_manager.run_threaded_job(new_job)
+        else:
+            delete_preview_docs(job.result.book_path)
     elif device_connected(gui, job.result.book_fmt):
         SendFile(gui, job.result, notif).send_files(None)
     else:
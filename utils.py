@@ -3,10 +3,14 @@ import platform
 import shutil
 import subprocess
 import sys
+import threading
 import webbrowser
 import zipfile
 from pathlib import Path
-from typing import Any, TypedDict
+from typing import Any, Callable, TypedDict, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
 
 CJK_LANGS = ["zh", "ja", "ko"]
 PROFICIENCY_VERSION = "1.2.0"
@@ -28,6 +32,16 @@ class Prefs(TypedDict):
     show_change_kindle_ww_lang_warning: bool
     custom_entity_only: bool
     preview_x_ray: bool
+    nlp_processes: int
+    save_job_stats: bool
+    lemma_matcher: str
+    low_memory_spacy: bool
+    two_pass_nlp: bool
+    coalesce_paragraphs: bool
+    filter_content: bool
+    deferred_entity_clustering: bool
+    mediawiki_requests: int
+    prefetch_mediawiki: bool
 
 
 def load_plugin_json(plugin_path: Path, filepath: str) -> Any:
@@ -55,6 +69,64 @@ def run_subprocess(
         )
 
 
+def start_subprocess(args: list[str]) -> subprocess.Popen[bytes]:
+    from calibre.gui2 import sanitize_env_vars
+
+    with sanitize_env_vars():
+        return subprocess.Popen(
+            args,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            creationflags=(
+                subprocess.CREATE_NO_WINDOW  # type: ignore
+                if platform.system() == "Windows"
+                else 0
+            ),
+        )
+
+
+def run_subprocess_with_progress(args: list[str], notifications: Any) -> None:
+    """
+    Run a subprocess that writes progress JSON lines to stdout.
+    """
+    process = start_subprocess(args)
+    assert process.stdin is not None
+    assert process.stdout is not None
+    assert process.stderr is not None
+    process.stdin.close()
+    stderr = []
+    # read stderr in another thread, the subprocess blocks if the pipe is full
+    stderr_thread = threading.Thread(
+        target=lambda: stderr.append(process.stderr.read()),  # type: ignore
+        daemon=True,
+    )
+    stderr_thread.start()
+    # lines aren't JSON, added to the error
+    other_lines = []
+    try:
+        for line in process.stdout:
+            try:
+                message = json.loads(line)
+            except json.JSONDecodeError:
+                other_lines.append(line)
+                continue
+            if notifications and isinstance(message, dict) and "progress" in message:
+                notifications.put(tuple(message["progress"]))
+        returncode = process.wait()
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        stderr_thread.join()
+        process.stdout.close()
+        process.stderr.close()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(
+            returncode, args, output=b"".join(other_lines), stderr=b"".join(stderr)
+        )
+
+
 def mac_bin_path(command: str) -> str:
     # stupid macOS loses PATH when calibre is not launched from terminal
     # search homebrew binary path first
@@ -195,3 +267,36 @@ def get_mediawiki_db_path(lang: str, api_url: str, plugin_path: Path) -> Path:
     return plugin_path.parent.joinpath(
         f"worddumb-mediawiki/{domain}_v{PROFICIENCY_MAJOR_VERSION}.db"
     )
+
+
+def split_lanes(jobs: list[T], lang: Callable[[T], str], lanes: int) -> list[list[T]]:
+    """
+    Split jobs into lanes of similar size, each lane runs its jobs in order.
+    Jobs of the same language are kept next to each other, so a lane only
+    loads a few spaCy models, and a language is shared by several lanes if
+    it has more jobs.
+    """
+    jobs = sorted(jobs, key=lang)
+    lanes = max(min(lanes, len(jobs)), 1)
+    return [
+        jobs[index * len(jobs) // lanes : (index + 1) * len(jobs) // lanes]
+        for index in range(lanes)
+    ]
+
+
+def run_lanes(lanes: list[list[T]], run_job: Callable[[T, int], R]) -> list[R]:
+    """
+    Run lanes at the same time, `run_job()` is called with a job and the lane
+    index used as the worker id.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def run_lane(worker_id: int, lane: list[T]) -> list[R]:
+        return [run_job(job, worker_id) for job in lane]
+
+    with ThreadPoolExecutor(max_workers=max(len(lanes), 1)) as executor:
+        return [
+            result
+            for results in executor.map(run_lane, range(len(lanes)), lanes)
+            for result in results
+        ]
@@ -1,6 +1,5 @@
 import re
 from collections import defaultdict
-from functools import partial
 from pathlib import Path
 from sqlite3 import Connection
 
@@ -15,6 +14,7 @@ try:
         insert_x_types,
         save_db,
     )
+    from .job_stats import JobStats
     from .mediawiki import (
         MediaWiki,
         Wikidata,
@@ -24,10 +24,11 @@ try:
     from .metadata import KFXJson
     from .utils import Prefs
     from .x_ray_share import (
-        FUZZ_THRESHOLD,
         PERSON_LABELS,
         CustomXDict,
+        EntityResolver,
         XRayEntity,
+        cluster_entities,
         is_full_name,
     )
 except ImportError:
@@ -41,6 +42,7 @@ except ImportError:
         insert_x_types,
         save_db,
     )
+    from job_stats import JobStats
     from mediawiki import (
         MediaWiki,
         Wikidata,
@@ -50,10 +52,11 @@ except ImportError:
     from metadata import KFXJson
     from utils import Prefs
     from x_ray_share import (
-        FUZZ_THRESHOLD,
         PERSON_LABELS,
         CustomXDict,
+        EntityResolver,
         XRayEntity,
+        cluster_entities,
         is_full_name,
     )
 
@@ -65,10 +68,13 @@ class X_Ray:
         mediawiki: MediaWiki | None,
         wikidata: Wikidata | None,
         custom_x_ray: CustomXDict,
+        deferred_clustering: bool = False,
     ) -> None:
         self.conn = conn
         self.entity_id = 1
         self.entities: dict[str, XRayEntity] = {}
+        # similar names are merged in finish()
+        self.entity_resolver = None if deferred_clustering else EntityResolver()
         self.num_images = 0
         self.mediawiki = mediawiki
         self.wikidata = wikidata
@@ -118,22 +124,15 @@ class X_Ray:
     def add_entity(
         self, entity: str, ner_label: str, start: int, quote: str, entity_len: int
     ) -> None:
-        from rapidfuzz.fuzz import token_set_ratio
-        from rapidfuzz.process import extractOne
-        from rapidfuzz.utils import default_process
-
         if entity_data := self.entities.get(entity):
             entity_id = entity_data.id
             entity_data.count += 1
-        elif entity not in self.custom_x_ray and (
-            r := extractOne(
-                entity,
-                self.entities.keys(),
-                score_cutoff=FUZZ_THRESHOLD,
-                scorer=partial(token_set_ratio, processor=default_process),
-            )
+            self.prefetch_description(entity, entity_data)
+        elif (
+            self.entity_resolver is not None
+            and entity not in self.custom_x_ray
+            and (matched_name := self.entity_resolver.find(entity))
         ):
-            matched_name = r[0]
             matched_entity = self.entities[matched_name]
             matched_entity.count += 1
             entity_id = matched_entity.id
@@ -141,13 +140,34 @@ class X_Ray:
                 # replace partial name with full name
                 self.entities[entity] = self.entities[matched_name]
                 del self.entities[matched_name]
+                self.entity_resolver.remove(matched_name)
+                self.entity_resolver.add(entity)
+                matched_name = entity
+            self.prefetch_description(matched_name, matched_entity)
         else:
             entity_id = self.entity_id
             self.entities[entity] = XRayEntity(entity_id, quote, ner_label, 1)
+            if self.entity_resolver is not None:
+                self.entity_resolver.add(entity)
             self.entity_id += 1
 
         self.entity_occurrences[entity_id].append((start, entity_len))
 
+    def cluster_entities(self, job_stats: JobStats) -> None:
+        merged_ids = cluster_entities(self.entities, self.custom_x_ray)
+        for merged_id, kept_id in merged_ids.items():
+            occurrences = self.entity_occurrences[kept_id]
+            occurrences.extend(self.entity_occurrences.pop(merged_id))
+            occurrences.sort()
+        job_stats.count("clustered_entities", len(merged_ids))
+
+    def prefetch_description(self, entity: str, entity_data: XRayEntity) -> None:
+        if (
+            self.mediawiki is not None
+            and entity_data.count == self.mediawiki.prefetch_count
+        ):
+            self.mediawiki.prefetch(entity)
+
     def merge_entities(self, prefs: Prefs) -> None:
         for entity_name, entity_data in self.entities.copy().items():
             if entity_name in self.custom_x_ray:
@@ -178,55 +198,64 @@ class X_Ray:
         mobi_html: bytes,
         mobi_codec: str,
         prefs: Prefs,
+        job_stats: JobStats,
     ) -> None:
-        if self.mediawiki is not None:
-            self.mediawiki.query(self.entities)
-        if self.wikidata is not None:
-            query_wikidata(self.entities, self.mediawiki, self.wikidata)
-        self.merge_entities(prefs)
+        if self.entity_resolver is None:
+            with job_stats.stage("clustering", len(self.entities)):
+                self.cluster_entities(job_stats)
+        with job_stats.stage("mediawiki"):
+            if self.mediawiki is not None:
+                self.mediawiki.query(self.entities)
+            if self.wikidata is not None:
+                query_wikidata(self.entities, self.mediawiki, self.wikidata)
+        with job_stats.stage("entities"):
+            self.merge_entities(prefs)
 
-        insert_x_entities(
-            self.conn,
-            (
+        with job_stats.stage("write"):
+            insert_x_entities(
+                self.conn,
                 (
-                    entity_data.id,
-                    entity_name,
-                    1 if entity_data.label in PERSON_LABELS else 2,
-                    entity_data.count,
-                )
-                for entity_name, entity_data in self.entities.items()
-            ),
-        )
-        insert_x_occurrences(
-            self.conn,
-            (
-                (entity_id, start, entity_length)
-                for entity_id, occurrence_list in self.entity_occurrences.items()
-                for start, entity_length in occurrence_list
-            ),
-        )
-        self.insert_descriptions()
+                    (
+                        entity_data.id,
+                        entity_name,
+                        1 if entity_data.label in PERSON_LABELS else 2,
+                        entity_data.count,
+                    )
+                    for entity_name, entity_data in self.entities.items()
+                ),
+            )
+            insert_x_occurrences(
+                self.conn,
+                (
+                    (entity_id, start, entity_length)
+                    for entity_id, occurrence_list in self.entity_occurrences.items()
+                    for start, entity_length in occurrence_list
+                ),
+            )
+            self.insert_descriptions()
 
-        if kfx_json:
-            self.find_kfx_images(kfx_json)
-        else:
-            self.find_mobi_images(mobi_html, mobi_codec)
-        if self.num_images:
-            preview_images = ",".join(map(str, range(self.num_images)))
-        else:
-            preview_images = None
-        insert_x_book_metadata(
-            self.conn,
-            erl,
-            self.num_images,
-            preview_images,
-        )
-        insert_x_types(self.conn)
-        create_x_indices(self.conn)
-        save_db(self.conn, db_path)
+            if kfx_json:
+                self.find_kfx_images(kfx_json)
+            else:
+                self.find_mobi_images(mobi_html, mobi_codec)
+            if self.num_images:
+                preview_images = ",".join(map(str, range(self.num_images)))
+            else:
+                preview_images = None
+            insert_x_book_metadata(
+                self.conn,
+                erl,
+                self.num_images,
+                preview_images,
+            )
+            insert_x_types(self.conn)
+            create_x_indices(self.conn)
+            save_db(self.conn, db_path)
         if self.mediawiki is not None:
+            self.mediawiki.scheduler.save_stats(job_stats, "mediawiki")
             self.mediawiki.close()
         if self.wikidata is not None:
+            self.wikidata.scheduler.save_stats(job_stats, "wikidata")
             self.wikidata.close()
 
     def find_kfx_images(self, kfx_json: list[KFXJson]) -> None:
@@ -1,6 +1,10 @@
 import json
+import math
 import re
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
 from dataclasses import dataclass
+from functools import partial
 from pathlib import Path
 
 FUZZ_THRESHOLD = 85.7
@@ -54,6 +58,111 @@ def is_full_name(
     )
 
 
+def min_common_bigrams(len_a: int, len_b: int) -> int:
+    """
+    Lower bound of the common character bigrams of two strings have Indel
+    similarity ratio not less than FUZZ_THRESHOLD. Each unmatched character of
+    the longest common subsequence breaks at most two bigrams.
+    """
+    # subtract one for float rounding
+    lcs_len = math.ceil(FUZZ_THRESHOLD * (len_a + len_b) / 200) - 1
+    if lcs_len > min(len_a, len_b):
+        return len_a + len_b  # impossible
+    return 3 * lcs_len - len_a - len_b - 1
+
+
+class EntityResolver:
+    """
+    Find the most similar entity name like rapidfuzz's `extractOne()` with
+    `token_set_ratio` and `default_process`, but only score the names share a
+    word or enough character bigrams with the new name. Other names can't
+    have a score above FUZZ_THRESHOLD.
+    """
+
+    def __init__(self) -> None:
+        # name: insertion order, used to keep the first best match
+        self.names: dict[str, int] = {}
+        self.order = 0
+        self.word_index: dict[str, set[str]] = defaultdict(set)
+        # (bigram, length of the sorted words): names
+        self.bigram_index: dict[tuple[str, int], set[str]] = defaultdict(set)
+        self.bigram_freq: Counter[str] = Counter()
+        self.length_index: dict[int, set[str]] = defaultdict(set)
+
+    @staticmethod
+    def process(name: str) -> tuple[set[str], int, Counter[str]]:
+        from rapidfuzz.utils import default_process
+
+        words = set(default_process(name).split())
+        # token_set_ratio compares the sorted words if no word is shared
+        sorted_words = " ".join(sorted(words))
+        bigrams = Counter(sorted_words[i : i + 2] for i in range(len(sorted_words) - 1))
+        return words, len(sorted_words), bigrams
+
+    def add(self, name: str) -> None:
+        words, length, bigrams = self.process(name)
+        self.names[name] = self.order
+        self.order += 1
+        for word in words:
+            self.word_index[word].add(name)
+        for bigram in bigrams:
+            self.bigram_index[(bigram, length)].add(name)
+        self.bigram_freq.update(bigrams.keys())
+        self.length_index[length].add(name)
+
+    def remove(self, name: str) -> None:
+        del self.names[name]
+        words, length, bigrams = self.process(name)
+        for word in words:
+            self.word_index[word].discard(name)
+        for bigram in bigrams:
+            self.bigram_index[(bigram, length)].discard(name)
+        self.bigram_freq.subtract(bigrams.keys())
+        self.length_index[length].discard(name)
+
+    def find(self, name: str) -> str | None:
+        from rapidfuzz.fuzz import token_set_ratio
+        from rapidfuzz.process import extractOne
+        from rapidfuzz.utils import default_process
+
+        words, length, bigrams = self.process(name)
+        if len(words) == 0:
+            return None
+        candidates: set[str] = set()
+        for word in words:
+            candidates.update(self.word_index.get(word, ()))
+
+        # names have at least n common bigrams share one of the first
+        # (bigrams count - n + 1) bigrams of the new name, start from the rarest
+        sorted_bigrams = [
+            bigram
+            for bigram, count in sorted(
+                bigrams.items(), key=lambda x: self.bigram_freq[x[0]]
+            )
+            for _ in range(count)
+        ]
+        for other_len, other_names in self.length_index.items():
+            if len(other_names) == 0:
+                continue
+            required = min_common_bigrams(length, other_len)
+            if required <= 0:
+                # short names could match without common bigram
+                candidates.update(other_names)
+                continue
+            for bigram in sorted_bigrams[: len(sorted_bigrams) - required + 1]:
+                candidates.update(self.bigram_index.get((bigram, other_len), ()))
+
+        if len(candidates) == 0:
+            return None
+        r = extractOne(
+            name,
+            sorted(candidates, key=self.names.__getitem__),
+            score_cutoff=FUZZ_THRESHOLD,
+            scorer=partial(token_set_ratio, processor=default_process),
+        )
+        return r[0] if r else None
+
+
 @dataclass
 class XRayEntity:
     id: int
@@ -88,3 +197,99 @@ def load_custom_x_desc(book_path: str | Path) -> CustomXDict:
             }
     else:
         return {}
+
+
+# maximum scores compared in one cdist() call
+CLUSTER_CHUNK_SCORES = 4_000_000
+
+
+def cluster_entities(
+    entities: dict[str, XRayEntity], custom_x_ray: CustomXDict
+) -> dict[int, int]:
+    """
+    Merge similar entity names after parsing the book. Names are compared with
+    the same scorer and threshold used by `EntityResolver`, but in the order
+    of customized names then the mention count, so the result doesn't depend
+    on the order of the mentions in the book.
+
+    Return a dictionary of merged entity id: kept entity id.
+    """
+    import numpy as np
+    from rapidfuzz.fuzz import ratio, token_set_ratio
+    from rapidfuzz.process import cdist
+    from rapidfuzz.utils import default_process
+
+    names = sorted(
+        entities, key=lambda x: (x not in custom_x_ray, -entities[x].count, x)
+    )
+    processed_names = [default_process(name) for name in names]
+    name_words = [set(name.split()) for name in processed_names]
+    word_index: dict[str, list[int]] = defaultdict(list)
+    for index, words in enumerate(name_words):
+        for word in words:
+            word_index[word].append(index)
+    # token_set_ratio is the Indel ratio of the sorted words if the names
+    # don't share a word, compare them with the faster vectorized scorer
+    sorted_words = [" ".join(sorted(words)) for words in name_words]
+
+    is_kept = np.zeros(len(names), dtype=bool)
+    # index of a kept name: current name in the entity dictionary
+    kept_names: dict[int, str] = {}
+    merged_ids: dict[int, int] = {}
+    chunk_size = max(CLUSTER_CHUNK_SCORES // max(len(names), 1), 1)
+    for chunk_start in range(0, len(names), chunk_size):
+        chunk_end = min(chunk_start + chunk_size, len(names))
+        # kept names renamed to the full name after computing the chunk scores
+        renamed_indexes: set[int] = set()
+        # scores below the threshold are 0
+        scores = cdist(
+            sorted_words[chunk_start:chunk_end],
+            sorted_words[:chunk_end],
+            scorer=ratio,
+            score_cutoff=FUZZ_THRESHOLD,
+            dtype=np.float64,
+            workers=-1,
+        )
+        for index in range(chunk_start, chunk_end):
+            name = names[index]
+            if len(name_words[index]) == 0:
+                continue
+            kept_scores = np.where(
+                is_kept[:index], scores[index - chunk_start, :index], 0
+            )
+            # ratio() could round the same score differently, score the
+            # names pass the threshold again to break ties like extractOne()
+            other_indexes = renamed_indexes.union(np.flatnonzero(kept_scores).tolist())
+            for word in name_words[index]:
+                indexes = word_index[word]
+                other_indexes.update(indexes[: bisect_left(indexes, index)])
+            for other_index in other_indexes:
+                if is_kept[other_index]:
+                    kept_scores[other_index] = token_set_ratio(
+                        processed_names[index],
+                        processed_names[other_index],
+                        score_cutoff=FUZZ_THRESHOLD,
+                    )
+            if name in custom_x_ray or not kept_scores.any():
+                is_kept[index] = True
+                kept_names[index] = name
+                continue
+            # first kept name has the highest score
+            kept_index = int(kept_scores.argmax())
+            kept_name = kept_names[kept_index]
+            kept_entity = entities[kept_name]
+            entity = entities.pop(name)
+            kept_entity.count += entity.count
+            merged_ids[entity.id] = kept_entity.id
+            if is_full_name(kept_name, kept_entity.label, name, entity.label):
+                # replace partial name with full name
+                entities[name] = entities.pop(kept_name)
+                kept_names[kept_index] = name
+                # compare the next names with the full name
+                processed_names[kept_index] = processed_names[index]
+                sorted_words[kept_index] = sorted_words[index]
+                for word in name_words[index] - name_words[kept_index]:
+                    insort(word_index[word], kept_index)
+                name_words[kept_index] |= name_words[index]
+                renamed_indexes.add(kept_index)
+    return merged_ids